@@ -1,11 +1,5 @@
 import os
-from src.data_preparation import prepare_data
-from src.feature_engineering import build_customer_features
-from src.rfm_analysis import run_rfm_analysis
-from src.cohort_analysis import run_cohort_analysis
-from src.monthly_metrics import build_monthly_metrics
-from src.visualization import generate_visualizations
-from src.dashboard import build_rfm_dashboard
+import argparse
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -21,17 +15,293 @@ FEATURED_DATA_PATH = os.path.join(DATA_DIR, 'featured', 'featured.csv')
 TABLES_PATH = os.path.join(OUTPUT_DIR, 'tables')
 FIGURES_PATH = os.path.join(OUTPUT_DIR, 'figures')
 DASHBOARD_HTML_PATH = os.path.join(DOCS_DIR, 'index.html')
+PARTITIONS_PATH = os.path.join(OUTPUT_DIR, 'partitions')
+PREVIEW_PATH = os.path.join(OUTPUT_DIR, 'preview')
 
 
-def main():
+# -----------------------------
+# Pipeline stages
+#
+# Each stage imports its module on demand, so a headless run such as
+# `python main.py rfm` never loads matplotlib or plotly.
+# -----------------------------
+def run_clean(args):
+    from src.data_preparation import prepare_data
+    prepare_data(args.raw, args.clean)
+
+
+def run_features(args):
+    from src.feature_engineering import build_customer_features
+    build_customer_features(args.clean, args.featured)
+
+
+def run_rfm(args):
+    from src.rfm_analysis import run_rfm_analysis
+
+    # In a full run segment_analysis.csv is a view of the rollup cube
+    run_rfm_analysis(
+        args.featured,
+        args.tables,
+        write_segment_analysis=args.command != "all"
+    )
+
+
+def run_clv(args):
+    from src.clv_model import run_clv_model
+    run_clv_model(
+        args.featured,
+        args.tables,
+        months=args.clv_months,
+        fit_sample=args.clv_fit_sample,
+        chunk_size=args.clv_chunk_size
+    )
+
+
+def run_cube(args):
+    from src.rollup_cube import run_rollup_cube
+    run_rollup_cube(
+        args.clean,
+        os.path.join(args.tables, "rfm_analysis.csv"),
+        args.tables,
+        sketch=args.cube_sketch,
+        hll_precision=args.hll_precision
+    )
+
+
+def run_cohort(args):
+    from src.cohort_analysis import run_cohort_analysis
+    run_cohort_analysis(
+        args.clean,
+        args.tables,
+        granularity=args.granularity,
+        write_dense=not args.sparse_only
+    )
+
+
+def run_monthly(args):
+    from src.monthly_metrics import build_monthly_metrics
+    build_monthly_metrics(args.clean, args.tables)
+
+
+def run_products(args):
+    from src.product_affinity import run_product_affinity
+    run_product_affinity(
+        args.clean,
+        os.path.join(args.tables, "rfm_analysis.csv"),
+        args.tables
+    )
+
+
+def run_plots(args):
+    from src.visualization import generate_visualizations
+    generate_visualizations(args.tables, args.figures)
+
+
+def run_dashboard(args):
+    from src.dashboard import build_rfm_dashboard
+    build_rfm_dashboard(
+        args.tables,
+        args.dashboard,
+        lazy=args.lazy_dashboard,
+        offline=args.offline
+    )
+
+
+def run_serve(args):
+    from src.dashboard_server import serve_dashboard
+    serve_dashboard(
+        args.tables,
+        os.path.dirname(args.dashboard),
+        host=args.host,
+        port=args.port
+    )
+
+
+def run_partitioned_pipeline(args):
+    from src.data_preparation import prepare_data
+    from src.partitioned import run_partitioned
+
+    # Clean once, then fan out the per-customer stages per partition
+    clean_df = prepare_data(args.raw, args.clean)
+    run_partitioned(
+        clean_df,
+        args.partitions,
+        key=args.key,
+        workers=args.workers,
+        min_customers=args.min_customers,
+        granularity=args.granularity,
+        write_dense=not args.sparse_only
+    )
+
+
+def run_preview_pipeline(args):
+    from src.preview import run_preview
+    from src.table_io import resolve_path
+
+    # Reuse the cleaned dataset when present; cleaning is a full parse
+    if not os.path.exists(resolve_path(args.clean)):
+        run_clean(args)
+
+    run_preview(
+        args.clean,
+        args.preview_dir,
+        fraction=args.fraction,
+        n_boot=args.n_boot,
+        seed=args.seed
+    )
+
+
+STAGES = {
+    "clean": run_clean,
+    "features": run_features,
+    "rfm": run_rfm,
+    "clv": run_clv,
+    "cube": run_cube,
+    "cohort": run_cohort,
+    "monthly": run_monthly,
+    "products": run_products,
+    "plots": run_plots,
+    "dashboard": run_dashboard,
+}
+
+PIPELINE = [
+    "clean",
+    "features",
+    "rfm",
+    "clv",
+    "cube",
+    "cohort",
+    "products",
+    "plots",
+    "dashboard",
+]
+
+
+def build_parser():
+
+    parser = argparse.ArgumentParser(
+        description="E-commerce RFM & cohort analysis pipeline."
+    )
+
+    # Shared path options (defaults match the project layout)
+    paths = argparse.ArgumentParser(add_help=False)
+    paths.add_argument("--raw", default=RAW_DATA_PATH,
+                       help="Raw transactional CSV.")
+    paths.add_argument("--clean", default=CLEAN_DATA_PATH,
+                       help="Cleaned transactions CSV.")
+    paths.add_argument("--featured", default=FEATURED_DATA_PATH,
+                       help="Customer-level feature CSV.")
+    paths.add_argument("--tables", default=TABLES_PATH,
+                       help="Output directory for analytical tables.")
+    paths.add_argument("--figures", default=FIGURES_PATH,
+                       help="Output directory for static figures.")
+    paths.add_argument("--dashboard", default=DASHBOARD_HTML_PATH,
+                       help="Output path of the dashboard HTML.")
+    paths.add_argument("--granularity", default="monthly",
+                       choices=["daily", "weekly", "monthly", "quarterly"],
+                       help="Cohort granularity.")
+    paths.add_argument("--sparse-only", action="store_true",
+                       help="Skip the dense cohort/retention CSV matrices.")
+    paths.add_argument("--clv-months", type=int, default=12,
+                       help="CLV prediction horizon in months.")
+    paths.add_argument("--clv-fit-sample", type=int, default=None,
+                       help="Fit the CLV models on this many customers.")
+    paths.add_argument("--clv-chunk-size", type=int, default=100_000,
+                       help="Customers scored per CLV chunk.")
+    paths.add_argument("--cube-sketch", default="exact",
+                       choices=["exact", "hll"],
+                       help="Distinct-customer sketch of the rollup cube.")
+    paths.add_argument("--hll-precision", type=int, default=12,
+                       help="HLL registers per cube cell (2 ** precision).")
+    paths.add_argument("--lazy-dashboard", action="store_true",
+                       help="Write per-view JSON files loaded on demand.")
+    paths.add_argument("--offline", action="store_true",
+                       help="Inline plotly.js instead of using the CDN.")
+    paths.add_argument("--compression", default=None,
+                       choices=["gzip", "zstd"],
+                       help="Compress output tables (zstd needs zstandard).")
+    paths.add_argument("--io-workers", type=int, default=4,
+                       help="Background threads writing output tables.")
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    for name in STAGES:
+        subparsers.add_parser(name, parents=[paths],
+                              help=f"Run the {name} stage only.")
+
+    subparsers.add_parser("all", parents=[paths],
+                          help="Run the full pipeline (default).")
+
+    serve = subparsers.add_parser(
+        "serve", parents=[paths],
+        help="Start the local dashboard server with the query API."
+    )
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+
+    partitioned = subparsers.add_parser(
+        "partitioned", parents=[paths],
+        help="Clean once, then run the analysis per partition in parallel."
+    )
+    partitioned.add_argument("--key", default="country",
+                             help="Column to partition by.")
+    partitioned.add_argument("--workers", type=int, default=None,
+                             help="Worker processes (default: CPU count).")
+    partitioned.add_argument("--min-customers", type=int, default=20,
+                             help="Skip partitions with fewer customers.")
+    partitioned.add_argument("--partitions", default=PARTITIONS_PATH,
+                             help="Output directory for partition results.")
+
+    preview = subparsers.add_parser(
+        "preview", parents=[paths],
+        help="Run on a stratified customer sample with bootstrap CIs."
+    )
+    preview.add_argument("--fraction", type=float, default=0.1,
+                         help="Share of customers sampled per stratum.")
+    preview.add_argument("--n-boot", type=int, default=200,
+                         help="Bootstrap replicates for the intervals.")
+    preview.add_argument("--seed", type=int, default=0)
+    preview.add_argument("--preview-dir", default=PREVIEW_PATH,
+                         help="Output directory for preview results.")
+
+    return parser, paths
+
+
+def main(argv=None):
+
+    parser, paths = build_parser()
+    args = parser.parse_args(argv)
+
+    # No subcommand keeps the original behaviour: run everything
+    if args.command is None:
+        args = paths.parse_args([], namespace=args)
+        args.command = "all"
+
+    if args.command == "serve":
+        run_serve(args)
+        return
+
+    from src.table_io import configure_writer, flush_writes
+
+    configure_writer(
+        compression=args.compression,
+        max_workers=args.io_workers
+    )
+
+    # Tables are written in the background; flush is the end-of-run barrier
+    try:
+        if args.command == "partitioned":
+            run_partitioned_pipeline(args)
+        elif args.command == "preview":
+            run_preview_pipeline(args)
+        else:
+            stages = PIPELINE if args.command == "all" else [args.command]
+
+            for name in stages:
+                STAGES[name](args)
+    finally:
+        flush_writes()
 
-    prepare_data(RAW_DATA_PATH, CLEAN_DATA_PATH)
-    build_customer_features(CLEAN_DATA_PATH, FEATURED_DATA_PATH)
-    run_rfm_analysis(FEATURED_DATA_PATH, TABLES_PATH)
-    run_cohort_analysis(CLEAN_DATA_PATH, TABLES_PATH)
-    build_monthly_metrics(CLEAN_DATA_PATH, TABLES_PATH)
-    generate_visualizations(TABLES_PATH, FIGURES_PATH)
-    build_rfm_dashboard(TABLES_PATH,DASHBOARD_HTML_PATH)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,300 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import gammaln, hyp2f1
+from src.table_io import load_table, write_table
+
+
+# -----------------------------
+# Model settings
+#
+# Time is measured in weeks for the fit (keeps alpha in a well-scaled
+# range); the prediction horizon is in 30-day months, like
+# orders_per_month in the featured table.
+# -----------------------------
+TIME_UNIT_DAYS = 7
+MONTH_DAYS = 30
+
+BGNBD_PARAMS = ["r", "alpha", "a", "b"]
+GAMMA_GAMMA_PARAMS = ["p", "q", "v"]
+
+
+def _clv_inputs(df):
+    """
+    BG/NBD / Gamma-Gamma inputs from the featured table:
+
+    - x: repeat purchases (distinct purchase days - 1), so several
+      invoices on one day count once, matching t_x's resolution
+    - t_x: time of the last purchase since the first one
+    - T: customer age (first purchase to the reference date)
+    - m: average value of the repeat purchases (NaN when x == 0)
+    """
+
+    missing = {"purchase_days", "repeat_purchase_value"} - set(df.columns)
+
+    if missing:
+        raise ValueError(
+            f"Featured table lacks {sorted(missing)}; "
+            "re-run the features stage."
+        )
+
+    return {
+        "x": (df["purchase_days"].to_numpy() - 1).astype(np.float64),
+        "t_x": df["lifetime_days"].to_numpy(dtype=np.float64)
+        / TIME_UNIT_DAYS,
+        "T": (
+            df["lifetime_days"].to_numpy(dtype=np.float64)
+            + df["recency_days"].to_numpy(dtype=np.float64)
+        ) / TIME_UNIT_DAYS,
+        "m": df["repeat_purchase_value"].to_numpy(dtype=np.float64),
+    }
+
+
+# -----------------------------
+# Log-likelihoods (vectorized over customers)
+# -----------------------------
+def bgnbd_log_likelihood(params, x, t_x, T):
+    """
+    Per-customer BG/NBD log-likelihood (Fader, Hardie & Lee, 2005).
+    The "dropped out after the last purchase" term only exists for
+    repeat buyers, so it is -inf at x == 0 and logaddexp ignores it.
+    """
+
+    r, alpha, a, b = params
+
+    a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    a2 = gammaln(a + b) + gammaln(b + x) - gammaln(b) - gammaln(a + b + x)
+    a3 = -(r + x) * np.log(alpha + T)
+
+    repeat = x > 0
+    a4 = np.full(len(x), -np.inf)
+    a4[repeat] = (
+        np.log(a)
+        - np.log(b + x[repeat] - 1)
+        - (r + x[repeat]) * np.log(alpha + t_x[repeat])
+    )
+
+    return a1 + a2 + np.logaddexp(a3, a4)
+
+
+def gamma_gamma_log_likelihood(params, x, m):
+    """
+    Per-customer Gamma-Gamma log-likelihood of the average value m of
+    x repeat purchases (Fader, Hardie & Lee, 2005b); defined for x > 0.
+    """
+
+    p, q, v = params
+
+    return (
+        gammaln(p * x + q) - gammaln(p * x) - gammaln(q)
+        + q * np.log(v)
+        + (p * x - 1) * np.log(m)
+        + p * x * np.log(x)
+        - (p * x + q) * np.log(x * m + v)
+    )
+
+
+def _fit(log_likelihood, n_params, data, penalizer=0.0):
+    """
+    Maximizes the mean log-likelihood over log-parameters (so every
+    parameter stays positive) with L-BFGS-B. Returns the parameters.
+    """
+
+    def objective(log_params):
+        params = np.exp(log_params)
+        ll = log_likelihood(params, **data)
+        return -ll.mean() + penalizer * np.sum(params ** 2)
+
+    result = minimize(
+        objective,
+        x0=np.zeros(n_params),
+        method="L-BFGS-B",
+        bounds=[(-15, 15)] * n_params,
+    )
+
+    if not result.success:
+        print("Warning: CLV fit did not converge:", result.message)
+
+    return np.exp(result.x)
+
+
+def fit_clv_models(df, fit_sample=None, seed=0, penalizer=0.0):
+    """
+    Fits the BG/NBD (purchase / dropout) and Gamma-Gamma (spend) models
+    on the featured table, optionally on a random sample of fit_sample
+    customers. Returns (bgnbd_params, gamma_gamma_params).
+    """
+
+    if fit_sample is not None and fit_sample < len(df):
+        rng = np.random.default_rng(seed)
+        df = df.iloc[rng.choice(len(df), size=fit_sample, replace=False)]
+
+    inputs = _clv_inputs(df)
+
+    bgnbd_params = _fit(
+        bgnbd_log_likelihood,
+        len(BGNBD_PARAMS),
+        {key: inputs[key] for key in ("x", "t_x", "T")},
+        penalizer=penalizer
+    )
+
+    # Gamma-Gamma is defined on repeat purchases only
+    repeat = (inputs["x"] > 0) & (inputs["m"] > 0)
+
+    if not repeat.any():
+        raise ValueError("Gamma-Gamma fit needs at least one repeat buyer.")
+
+    gamma_gamma_params = _fit(
+        gamma_gamma_log_likelihood,
+        len(GAMMA_GAMMA_PARAMS),
+        {"x": inputs["x"][repeat], "m": inputs["m"][repeat]},
+        penalizer=penalizer
+    )
+
+    return bgnbd_params, gamma_gamma_params
+
+
+# -----------------------------
+# Scoring
+# -----------------------------
+def _score_chunk(inputs, bgnbd_params, gamma_gamma_params, months,
+                 monthly_discount):
+
+    r, alpha, a, b = bgnbd_params
+    p, q, v = gamma_gamma_params
+    x, t_x, T = inputs["x"], inputs["t_x"], inputs["T"]
+
+    # Odds of having dropped out right after the last purchase
+    dropout_odds = np.zeros(len(x))
+    repeat = x > 0
+    dropout_odds[repeat] = (
+        a / (b + x[repeat] - 1)
+        * ((alpha + T[repeat]) / (alpha + t_x[repeat])) ** (r + x[repeat])
+    )
+    prob_alive = 1 / (1 + dropout_odds)
+
+    # Expected purchases by the end of every month of the horizon
+    t = np.arange(1, months + 1) * MONTH_DAYS / TIME_UNIT_DAYS
+    xc, Tc = x[:, None], T[:, None]
+    z = t / (alpha + Tc + t)
+
+    cumulative = (
+        (a + b + xc - 1) / (a - 1)
+        * (
+            1 - ((alpha + Tc) / (alpha + Tc + t)) ** (r + xc)
+            * hyp2f1(r + xc, b + xc, a + b + xc - 1, z)
+        )
+        * prob_alive[:, None]
+    )
+
+    monthly = np.diff(cumulative, axis=1, prepend=0.0)
+    discount = (1 + monthly_discount) ** -np.arange(1, months + 1)
+
+    # One-time buyers get the population mean p * v / (q - 1)
+    repeat_spend = np.where(repeat, x * inputs["m"], 0.0)
+    expected_order_value = p * (v + repeat_spend) / (p * x + q - 1)
+
+    return {
+        "expected_purchases": cumulative[:, -1],
+        "prob_alive": prob_alive,
+        "expected_order_value": expected_order_value,
+        "predicted_clv": (monthly @ discount) * expected_order_value,
+    }
+
+
+def score_clv(df, bgnbd_params, gamma_gamma_params, months=12,
+              annual_discount_rate=0.1, chunk_size=100_000):
+    """
+    Per-customer expected purchases over the next `months`, probability
+    of still being active, expected order value and discounted CLV.
+    Customers are scored chunk_size at a time, so memory is bounded by
+    chunk_size x months regardless of the customer count.
+    """
+
+    monthly_discount = (1 + annual_discount_rate) ** (1 / 12) - 1
+    inputs = _clv_inputs(df)
+
+    chunks = []
+    for start in range(0, len(df), chunk_size):
+        chunk = {
+            key: values[start:start + chunk_size]
+            for key, values in inputs.items()
+        }
+        chunks.append(
+            _score_chunk(
+                chunk,
+                bgnbd_params,
+                gamma_gamma_params,
+                months,
+                monthly_discount
+            )
+        )
+
+    predictions_df = pd.DataFrame({"customer_id": df["customer_id"]})
+
+    for column in chunks[0] if chunks else []:
+        predictions_df[column] = np.concatenate(
+            [chunk[column] for chunk in chunks]
+        )
+
+    return predictions_df.reset_index(drop=True)
+
+
+def run_clv_model(input_path, output_path, months=12, fit_sample=None,
+                  chunk_size=100_000, annual_discount_rate=0.1, seed=0):
+    """
+    Fits BG/NBD + Gamma-Gamma on the customer feature table and writes:
+
+    - clv_predictions.csv: expected purchases over the next `months`,
+      prob_alive (1 - churn probability), expected order value and
+      discounted predicted CLV per customer
+    - clv_parameters.csv: fitted model parameters
+
+    Likelihoods are evaluated for all customers at once; fit_sample
+    limits the fit to a random customer sample and scoring runs in
+    chunks of chunk_size customers.
+    """
+
+    df = load_table(input_path)
+    os.makedirs(output_path, exist_ok=True)
+
+    bgnbd_params, gamma_gamma_params = fit_clv_models(
+        df,
+        fit_sample=fit_sample,
+        seed=seed
+    )
+
+    params_df = pd.DataFrame({
+        "model": ["bgnbd"] * len(BGNBD_PARAMS)
+        + ["gamma_gamma"] * len(GAMMA_GAMMA_PARAMS),
+        "parameter": BGNBD_PARAMS + GAMMA_GAMMA_PARAMS,
+        "value": np.concatenate([bgnbd_params, gamma_gamma_params]),
+    })
+
+    print("CLV model parameters:")
+    print(params_df)
+
+    predictions_df = score_clv(
+        df,
+        bgnbd_params,
+        gamma_gamma_params,
+        months=months,
+        annual_discount_rate=annual_discount_rate,
+        chunk_size=chunk_size
+    )
+
+    write_table(
+        predictions_df,
+        os.path.join(output_path, "clv_predictions.csv"),
+        index=False
+    )
+    write_table(
+        params_df,
+        os.path.join(output_path, "clv_parameters.csv"),
+        index=False
+    )
+
+    print("CLV predictions saved to:", output_path)
+
+    return predictions_df
@@ -1,11 +1,142 @@
 import os
+import numpy as np
 import pandas as pd
+from src.table_io import load_table, write_table, write_npz, resolve_path
+
+
+# -----------------------------
+# Cohort granularity
+#
+# Each granularity maps to a pandas period frequency. Period ordinals
+# are consecutive integers for every frequency, so the cohort index is
+# simply the ordinal distance from the customer's first period.
+# -----------------------------
+COHORT_FREQUENCIES = {
+    "daily": "D",
+    "weekly": "W",
+    "monthly": "M",
+    "quarterly": "Q",
+}
+
+COHORT_MATRIX_FILE = "cohort_matrix.npz"
+
+
+def _cohort_label(granularity):
+
+    # Monthly keeps the historical column name used by the CSV outputs
+    return "cohort_month" if granularity == "monthly" else "cohort_period"
+
+
+def save_cohort_matrix(path, cohort_start, rows, cols, active, granularity):
+    """
+    Stores the cohort matrix in coordinate (triangular) form as a
+    compressed .npz file: only observed (cohort, index) cells are kept.
+    """
+
+    cohort_size = np.zeros(len(cohort_start), dtype=np.int64)
+    first_cell = cols == 0
+    cohort_size[rows[first_cell]] = active[first_cell]
+
+    write_npz(
+        path,
+        np.savez_compressed,
+        cohort_start=np.asarray(cohort_start, dtype="datetime64[D]"),
+        rows=rows.astype(np.int32),
+        cols=cols.astype(np.int32),
+        active=active.astype(np.int64),
+        cohort_size=cohort_size,
+        granularity=np.array(granularity),
+    )
+
+
+def load_cohort_matrix(path):
+    """
+    Loads a sparse cohort matrix written by save_cohort_matrix and adds
+    the per-cell retention rate.
+    """
+
+    with np.load(resolve_path(path)) as data:
+        matrix = {key: data[key] for key in data.files}
+
+    matrix["granularity"] = str(matrix["granularity"])
+    matrix["retention"] = (
+        matrix["active"] / matrix["cohort_size"][matrix["rows"]]
+    )
+
+    return matrix
+
+
+def downsample_retention(matrix, max_rows=60, max_cols=60):
+    """
+    Aggregates a sparse retention matrix into at most max_rows x max_cols
+    blocks without densifying the full matrix.
+
+    Each block holds the mean retention of the observed cells it covers;
+    blocks with no observed cells stay NaN (the empty lower-right triangle).
+    Returns a DataFrame indexed by the first cohort start of each block
+    and columned by the first cohort index of each block.
+    """
+
+    n_rows = len(matrix["cohort_start"])
+    n_cols = int(matrix["cols"].max()) + 1 if len(matrix["cols"]) else 0
 
+    row_step = max(1, int(np.ceil(n_rows / max_rows)))
+    col_step = max(1, int(np.ceil(n_cols / max_cols)))
 
-def run_cohort_analysis(input_path, output_path):
+    out_rows = int(np.ceil(n_rows / row_step))
+    out_cols = int(np.ceil(n_cols / col_step))
+
+    block = (
+        (matrix["rows"] // row_step) * out_cols
+        + (matrix["cols"] // col_step)
+    )
+
+    totals = np.bincount(
+        block,
+        weights=matrix["retention"],
+        minlength=out_rows * out_cols
+    )
+    counts = np.bincount(block, minlength=out_rows * out_cols)
+
+    with np.errstate(invalid="ignore"):
+        grid = (totals / counts).reshape(out_rows, out_cols)
+
+    return pd.DataFrame(
+        grid,
+        index=pd.Index(
+            pd.to_datetime(matrix["cohort_start"][::row_step]).date,
+            name=_cohort_label(matrix["granularity"])
+        ),
+        columns=pd.Index(
+            np.arange(out_cols) * col_step + 1,
+            name="cohort_index"
+        ),
+    )
+
+
+def run_cohort_analysis(input_path, output_path, granularity="monthly",
+                        write_dense=True):
+    """
+    Builds acquisition cohorts at the requested granularity
+    (daily, weekly, monthly or quarterly).
+
+    The cohort matrix is always saved in sparse form (cohort_matrix.npz)
+    next to the long-format cohort_counts.csv. The dense cohort and
+    retention CSV matrices are only written when write_dense is True,
+    since fine-grained cohorts over long histories are mostly empty.
+    """
+
+    if granularity not in COHORT_FREQUENCIES:
+        raise ValueError(
+            f"Unknown cohort granularity {granularity!r}; "
+            f"expected one of {sorted(COHORT_FREQUENCIES)}."
+        )
+
+    freq = COHORT_FREQUENCIES[granularity]
+    cohort_col = _cohort_label(granularity)
 
     # Load cleaned transactional dataset
-    df = pd.read_csv(input_path)
+    df = load_table(input_path)
     os.makedirs(output_path, exist_ok=True)
 
     # Ensure datetime consistency
@@ -13,46 +144,74 @@ def run_cohort_analysis(input_path, output_path):
 
     print("Initial shape:", df.shape)
 
-    # Map each transaction to its calendar month
-    df["invoice_month"] = (
-        df["invoice_date"]
-        .dt.to_period("M")
-        .dt.to_timestamp()
-    )
+    # Map each transaction to its period ordinal (consecutive integers)
+    invoice_period = df["invoice_date"].dt.to_period(freq)
+    df["invoice_period"] = invoice_period.array.asi8
 
-    # First purchase month per customer (cohort anchor)
-    df["cohort_month"] = (
-        df.groupby("customer_id")["invoice_month"]
+    # First purchase period per customer (cohort anchor)
+    df["cohort_period"] = (
+        df.groupby("customer_id")["invoice_period"]
         .transform("min")
     )
 
-    # Calculate month difference between invoice and cohort
-    year_diff = df["invoice_month"].dt.year - df["cohort_month"].dt.year
-    month_diff = df["invoice_month"].dt.month - df["cohort_month"].dt.month
-    total_month_diff = (year_diff * 12) + month_diff
-
-    # Cohort index starts from 1 (cohort month = 1)
-    df["cohort_index"] = total_month_diff + 1
+    # Cohort index starts from 1 (cohort period = 1)
+    df["cohort_index"] = df["invoice_period"] - df["cohort_period"] + 1
 
-    # Count unique active customers per cohort and month index
+    # Count unique active customers per cohort and period index
     cohort_counts_df = (
-        df.groupby(["cohort_month", "cohort_index"])
+        df.groupby(["cohort_period", "cohort_index"])
         .agg(
             active_customers=("customer_id", "nunique"),
         )
         .reset_index()
+    )
+
+    # Map period ordinals back to period start dates
+    cohort_ordinals = np.sort(cohort_counts_df["cohort_period"].unique())
+    cohort_start = (
+        pd.PeriodIndex.from_ordinals(cohort_ordinals, freq=freq)
+        .to_timestamp(how="start")
+    )
+
+    # Save sparse (triangular) cohort matrix
+    save_cohort_matrix(
+        os.path.join(output_path, COHORT_MATRIX_FILE),
+        cohort_start=cohort_start.values,
+        rows=np.searchsorted(
+            cohort_ordinals, cohort_counts_df["cohort_period"].values
+        ),
+        cols=cohort_counts_df["cohort_index"].values - 1,
+        active=cohort_counts_df["active_customers"].values,
+        granularity=granularity,
+    )
+
+    cohort_counts_df[cohort_col] = pd.PeriodIndex.from_ordinals(
+        cohort_counts_df["cohort_period"].values, freq=freq
+    ).to_timestamp(how="start")
+
+    cohort_counts_df = (
+        cohort_counts_df[[cohort_col, "cohort_index", "active_customers"]]
         .sort_values("cohort_index")
     )
 
     # Save long-format cohort counts
-    cohort_counts_df.to_csv(
+    write_table(
+        cohort_counts_df,
         os.path.join(output_path, "cohort_counts.csv"),
         index=False
     )
 
+    print("Cohort granularity:", granularity)
+    print("Cohorts:", len(cohort_ordinals),
+          "| observed cells:", len(cohort_counts_df))
+
+    if not write_dense:
+        print("Sparse cohort matrix saved to:", output_path)
+        return cohort_counts_df
+
     # Pivot into retention matrix (wide format)
     cohort_matrix_df = cohort_counts_df.pivot(
-        index="cohort_month",
+        index=cohort_col,
         columns="cohort_index",
         values="active_customers"
     )
@@ -61,20 +220,11 @@ def run_cohort_analysis(input_path, output_path):
     print(cohort_matrix_df.head())
 
     # Save cohort matrix
-    cohort_matrix_df.to_csv(
+    write_table(
+        cohort_matrix_df,
         os.path.join(output_path, "cohort_matrix.csv")
     )
 
-
-    print("Sample cohort mapping:")
-    print(
-        df[["customer_id", "invoice_month", "cohort_month", "cohort_index"]]
-        .head(10)
-    )
-
-
-
-
     retention_matrix_df = cohort_matrix_df.divide(
         cohort_matrix_df.iloc[:, 0],
         axis=0
@@ -83,6 +233,9 @@ def run_cohort_analysis(input_path, output_path):
     print("Retention matrix preview:")
     print(retention_matrix_df.head())
 
-    retention_matrix_df.to_csv(
+    write_table(
+        retention_matrix_df,
         os.path.join(output_path, "retention_matrix.csv")
     )
+
+    return cohort_counts_df
@@ -1,7 +1,14 @@
 import os
-import pandas as pd
+import json
+import numpy as np
 import plotly.graph_objects as go
 import plotly.io as pio
+from src.cohort_analysis import (
+    COHORT_MATRIX_FILE,
+    load_cohort_matrix,
+    downsample_retention,
+)
+from src.table_io import load_table, resolve_path, write_text
 
 
 # -----------------------------
@@ -19,38 +26,200 @@ HEATMAP_COLORSCALE = [
     [1.0, "#3E7C7C"],
 ]
 
+# -----------------------------
+# Dashboard views
+#
+# (file name, select label, chart title), in metricSelect order.
+# In lazy mode each view is written to data/<name>.json next to the page.
+# -----------------------------
+VIEWS = [
+    ("revenue_by_segment", "Revenue by Segment",
+     "Revenue by Customer Segment"),
+    ("rfm_score_distribution", "RFM Score Distribution",
+     "RFM Score Distribution"),
+    ("monthly_revenue_trend", "Monthly Revenue Trend",
+     "Monthly Revenue Trend"),
+    ("monthly_order_trend", "Monthly Order Trend",
+     "Monthly Order Trend"),
+    ("cohort_retention", "Cohort Retention Heatmap",
+     "Cohort Retention Heatmap"),
+]
 
-def build_rfm_dashboard(csv_dir: str, output_html_path: str):
 
-    os.makedirs(os.path.dirname(output_html_path), exist_ok=True)
+def _load_retention(csv_dir, max_rows=60, max_cols=60):
 
-    # -----------------------------
-    # Load CSVs
-    # -----------------------------
-    segment_df = pd.read_csv(os.path.join(csv_dir, "segment_analysis.csv"))
-    rfm_df = pd.read_csv(os.path.join(csv_dir, "rfm_analysis.csv"))
-    retention_df = pd.read_csv(
+    sparse_path = os.path.join(csv_dir, COHORT_MATRIX_FILE)
+
+    # Sparse matrix is block-averaged so the embedded heatmap stays small
+    if os.path.exists(resolve_path(sparse_path)):
+        return downsample_retention(
+            load_cohort_matrix(sparse_path),
+            max_rows=max_rows,
+            max_cols=max_cols
+        )
+
+    return load_table(
         os.path.join(csv_dir, "retention_matrix.csv"),
         index_col=0
     )
-    monthly_metrics_df = pd.read_csv(
-        os.path.join(csv_dir, "monthly_metrics.csv")
+
+
+def _downsample_series(df, x_col, max_points):
+    """
+    Reduces a long time series to at most max_points rows by averaging
+    consecutive buckets; each bucket keeps the x value of its first row.
+    """
+
+    if max_points is None or len(df) <= max_points:
+        return df
+
+    bucket = np.arange(len(df)) * max_points // len(df)
+
+    return (
+        df.groupby(bucket)
+        .agg({
+            col: ("first" if col == x_col else "mean")
+            for col in df.columns
+        })
+        .reset_index(drop=True)
     )
 
-    # -----------------------------
-    # Prepare datasets
-    # -----------------------------
+
+def _load_datasets(csv_dir, max_points=None):
+
+    segment_df = load_table(os.path.join(csv_dir, "segment_analysis.csv"))
+
+    # Only the score column is needed for the distribution
     rfm_score_dist = (
-        rfm_df["RFM_score"]
+        load_table(
+            os.path.join(csv_dir, "rfm_analysis.csv"),
+            usecols=["RFM_score"]
+        )["RFM_score"]
         .value_counts()
         .sort_index()
         .reset_index()
     )
     rfm_score_dist.columns = ["rfm_score", "customer_count"]
 
+    retention_df = _load_retention(csv_dir)
+
+    monthly_metrics_df = _downsample_series(
+        load_table(os.path.join(csv_dir, "monthly_metrics.csv")),
+        x_col="invoice_month",
+        max_points=max_points
+    )
+
+    return segment_df, rfm_score_dist, retention_df, monthly_metrics_df
+
+
+def _json_values(values, decimals=None):
+
+    # NaN is not valid JSON; missing heatmap cells become null
+    values = np.asarray(values, dtype=float)
+    if decimals is not None:
+        values = np.round(values, decimals)
+
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _write_view_payloads(data_dir, segment_df, rfm_score_dist,
+                         retention_df, monthly_metrics_df):
+
+    os.makedirs(data_dir, exist_ok=True)
+
+    payloads = [
+        {
+            "type": "bar",
+            "x": segment_df["segment"].astype(str).tolist(),
+            "y": _json_values(segment_df["total_revenue"], 2),
+        },
+        {
+            "type": "bar",
+            "x": rfm_score_dist["rfm_score"].astype(str).tolist(),
+            "y": _json_values(rfm_score_dist["customer_count"]),
+        },
+        {
+            "type": "line",
+            "x": monthly_metrics_df["invoice_month"].astype(str).tolist(),
+            "y": _json_values(monthly_metrics_df["total_revenue"], 2),
+        },
+        {
+            "type": "line",
+            "x": monthly_metrics_df["invoice_month"].astype(str).tolist(),
+            "y": _json_values(monthly_metrics_df["total_orders"], 2),
+        },
+        {
+            "type": "heatmap",
+            "x": retention_df.columns.astype(str).tolist(),
+            "y": retention_df.index.astype(str).tolist(),
+            "z": [_json_values(row, 4) for row in retention_df.values],
+        },
+    ]
+
+    for (name, _, title), payload in zip(VIEWS, payloads):
+        payload["title"] = title
+        write_text(
+            os.path.join(data_dir, f"{name}.json"),
+            json.dumps(payload, separators=(",", ":"))
+        )
+
+
+def _base_layout(fig, cohort_axis_title):
+
     # -----------------------------
-    # Build Figure
+    # Base Layout
+    # -----------------------------
+    fig.update_layout(
+        title=dict(text="Revenue by Customer Segment", x=0.5),
+        plot_bgcolor="white",
+        paper_bgcolor="white",
+        font=dict(color=DARK_COLOR),
+        margin=dict(t=80),
+        yaxis=dict(
+            title="Value",
+            gridcolor=GRID_COLOR,
+            showgrid=True,
+            zeroline=False,
+            showline=True,
+            linecolor=BORDER_COLOR,
+            mirror=True,
+            showticklabels=True
+        ),
+        xaxis=dict(
+            showgrid=False,
+            showline=True,
+            linecolor=BORDER_COLOR,
+            mirror=True
+        ),
+        bargap=0.6,
+    )
+
     # -----------------------------
+    # Heatmap Dedicated Axes
+    # -----------------------------
+    fig.update_layout(
+        xaxis2=dict(
+            title="Cohort Index",
+            type="category",
+            overlaying="x",
+            side="bottom",
+            visible=False
+        ),
+        yaxis2=dict(
+            title=cohort_axis_title,
+            type="category",
+            autorange="reversed",
+            overlaying="y",
+            side="left",
+            visible=False,
+            showticklabels=True
+        )
+    )
+
+
+def _build_full_figure(segment_df, rfm_score_dist, retention_df,
+                       monthly_metrics_df):
+
     fig = go.Figure()
 
     # 0 — Revenue by Segment
@@ -104,68 +273,163 @@ def build_rfm_dashboard(csv_dir: str, output_html_path: str):
         yaxis="y2"
     ))
 
+    return fig
+
+
+# -----------------------------
+# Client-side view switching
+# -----------------------------
+_TOGGLE_AXES_JS = """
+    if (val == 4) {
+        Plotly.relayout("rfmDashboard", {
+            "xaxis2.visible": true,
+            "yaxis2.visible": true,
+            "yaxis.showticklabels": false
+        });
+    } else {
+        Plotly.relayout("rfmDashboard", {
+            "xaxis2.visible": false,
+            "yaxis2.visible": false,
+            "yaxis.showticklabels": true
+        });
+    }
+"""
+
+_INLINE_SCRIPT = """
+function updateChart() {
+    const val = document.getElementById("metricSelect").value;
+    let visibility = [false, false, false, false, false];
+    visibility[val] = true;
+
+    let titles = %(titles)s;
+
+    Plotly.restyle("rfmDashboard", "visible", visibility);
+    Plotly.relayout("rfmDashboard", {
+        title: { text: titles[val], x: 0.5 }
+    });
+%(toggle_axes)s}
+"""
+
+_LAZY_SCRIPT = """
+const VIEW_FILES = %(files)s;
+const viewCache = {};
+
+async function loadView(val) {
+    if (!(val in viewCache)) {
+        const response = await fetch(VIEW_FILES[val]);
+        viewCache[val] = await response.json();
+    }
+    return viewCache[val];
+}
+
+function toTrace(view) {
+    if (view.type == "heatmap") {
+        return {
+            type: "heatmap", x: view.x, y: view.y, z: view.z,
+            colorscale: %(colorscale)s,
+            colorbar: { title: { text: "Retention Rate" } },
+            xaxis: "x2", yaxis: "y2"
+        };
+    }
+    if (view.type == "line") {
+        return {
+            type: "scatter", mode: "lines+markers", x: view.x, y: view.y,
+            line: { color: "%(main_color)s", width: 3 }
+        };
+    }
+    return { type: "bar", x: view.x, y: view.y, marker: { color: "%(main_color)s" } };
+}
+
+async function updateChart() {
+    const val = document.getElementById("metricSelect").value;
+    const view = await loadView(val);
+    const gd = document.getElementById("rfmDashboard");
+
+    await Plotly.react(gd, [toTrace(view)], gd.layout);
+    Plotly.relayout("rfmDashboard", {
+        title: { text: view.title, x: 0.5 }
+    });
+%(toggle_axes)s}
+
+updateChart();
+"""
+
+
+def build_rfm_dashboard(csv_dir: str, output_html_path: str,
+                        lazy: bool = False, offline: bool = False,
+                        max_points: int = 500):
+    """
+    Builds the interactive dashboard page.
+
+    By default every view is embedded in the HTML. With lazy=True each
+    view's pre-aggregated data is written as a compact JSON file under
+    data/ next to the page and only fetched when selected; the page then
+    has to be served over HTTP (e.g. GitHub Pages or `python -m
+    http.server`). offline=True inlines plotly.js instead of using the
+    CDN. Time series longer than max_points are bucket-averaged.
+    """
+
+    os.makedirs(os.path.dirname(output_html_path), exist_ok=True)
+
     # -----------------------------
-    # Base Layout
+    # Load and prepare datasets
     # -----------------------------
-    fig.update_layout(
-        title=dict(text="Revenue by Customer Segment", x=0.5),
-        plot_bgcolor="white",
-        paper_bgcolor="white",
-        font=dict(color=DARK_COLOR),
-        margin=dict(t=80),
-        yaxis=dict(
-            title="Value",
-            gridcolor=GRID_COLOR,
-            showgrid=True,
-            zeroline=False,
-            showline=True,
-            linecolor=BORDER_COLOR,
-            mirror=True,
-            showticklabels=True
-        ),
-        xaxis=dict(
-            showgrid=False,
-            showline=True,
-            linecolor=BORDER_COLOR,
-            mirror=True
-        ),
-        bargap=0.6,
+    segment_df, rfm_score_dist, retention_df, monthly_metrics_df = (
+        _load_datasets(csv_dir, max_points=max_points)
     )
+    cohort_axis_title = retention_df.index.name.replace("_", " ").title()
 
     # -----------------------------
-    # Heatmap Dedicated Axes
+    # Build Figure
     # -----------------------------
-    fig.update_layout(
-        xaxis2=dict(
-            title="Cohort Index",
-            type="category",
-            overlaying="x",
-            side="bottom",
-            visible=False
-        ),
-        yaxis2=dict(
-            title="Cohort Month",
-            type="category",
-            autorange="reversed",
-            overlaying="y",
-            side="left",
-            visible=False,
-            showticklabels=True
+    if lazy:
+        data_dir = os.path.join(os.path.dirname(output_html_path), "data")
+        _write_view_payloads(
+            data_dir,
+            segment_df,
+            rfm_score_dist,
+            retention_df,
+            monthly_metrics_df
         )
-    )
+
+        # Empty figure carries the layout; traces arrive on demand
+        fig = go.Figure()
+        script = _LAZY_SCRIPT % {
+            "files": json.dumps([f"data/{name}.json" for name, _, _ in VIEWS]),
+            "colorscale": json.dumps(HEATMAP_COLORSCALE),
+            "main_color": MAIN_COLOR,
+            "toggle_axes": _TOGGLE_AXES_JS,
+        }
+    else:
+        fig = _build_full_figure(
+            segment_df,
+            rfm_score_dist,
+            retention_df,
+            monthly_metrics_df
+        )
+        script = _INLINE_SCRIPT % {
+            "titles": json.dumps([title for _, _, title in VIEWS]),
+            "toggle_axes": _TOGGLE_AXES_JS,
+        }
+
+    _base_layout(fig, cohort_axis_title)
 
     plot_html = pio.to_html(
         fig,
         full_html=False,
-        include_plotlyjs="cdn",
+        include_plotlyjs=True if offline else "cdn",
         div_id="rfmDashboard"
     )
 
+    options = "\n".join(
+        f'    <option value="{i}">{label}</option>'
+        for i, (_, label, _) in enumerate(VIEWS)
+    )
+
     # -----------------------------
     # Write HTML
     # -----------------------------
-    with open(output_html_path, "w", encoding="utf-8") as f:
-        f.write(f"""
+    write_text(output_html_path, f"""
 <html>
 <head>
 <title>E-Commerce RFM & Cohort Dashboard</title>
@@ -185,11 +449,7 @@ E-Commerce RFM & Cohort Analytics Dashboard
     font-size:15px;
     color:{DARK_COLOR};
 " onchange="updateChart()">
-    <option value="0">Revenue by Segment</option>
-    <option value="1">RFM Score Distribution</option>
-    <option value="2">Monthly Revenue Trend</option>
-    <option value="3">Monthly Order Trend</option>
-    <option value="4">Cohort Retention Heatmap</option>
+{options}
 </select>
 </div>
 
@@ -206,38 +466,7 @@ E-Commerce RFM & Cohort Analytics Dashboard
 </div>
 
 <script>
-function updateChart() {{
-    const val = document.getElementById("metricSelect").value;
-    let visibility = [false, false, false, false, false];
-    visibility[val] = true;
-
-    let titles = [
-        "Revenue by Customer Segment",
-        "RFM Score Distribution",
-        "Monthly Revenue Trend",
-        "Monthly Order Trend",
-        "Cohort Retention Heatmap"
-    ];
-
-    Plotly.restyle("rfmDashboard", "visible", visibility);
-    Plotly.relayout("rfmDashboard", {{
-        title: {{ text: titles[val], x: 0.5 }}
-    }});
-
-    if (val == 4) {{
-        Plotly.relayout("rfmDashboard", {{
-            "xaxis2.visible": true,
-            "yaxis2.visible": true,
-            "yaxis.showticklabels": false
-        }});
-    }} else {{
-        Plotly.relayout("rfmDashboard", {{
-            "xaxis2.visible": false,
-            "yaxis2.visible": false,
-            "yaxis.showticklabels": true
-        }});
-    }}
-}}
+{script}
 </script>
 
 </body>
@@ -0,0 +1,384 @@
+import os
+import json
+from functools import lru_cache, partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+from src.cohort_analysis import COHORT_MATRIX_FILE, load_cohort_matrix
+from src.money import from_minor_units, with_minor_units
+from src.rollup_cube import CUBE_DIMENSIONS, CUBE_FILE, load_rollup_cube
+from src.table_io import load_table, resolve_path
+
+
+CUSTOMER_COLUMNS = [
+    "customer_id",
+    "recency",
+    "frequency",
+    "monetary",
+    "RFM_score",
+    "RFM_code",
+    "segment",
+]
+
+GROUP_BY_COLUMNS = ["segment", "R_score", "F_score", "M_score", "RFM_score"]
+
+MAX_PAGE_SIZE = 1000
+
+ENDPOINTS = ("segments", "customers", "aggregate", "cohort", "cube")
+
+
+class DashboardData:
+    """
+    In-memory RFM and cohort tables with per-segment indexes.
+
+    Customers are stored sorted by (segment, monetary), so every segment is
+    a contiguous block and monetary range filters are binary searches
+    inside that block. Query results are cached with LRU eviction.
+    """
+
+    def __init__(self, csv_dir, cache_size=256):
+
+        # -----------------------------
+        # RFM table, sorted by segment then monetary
+        # -----------------------------
+        rfm_df = with_minor_units(
+            load_table(os.path.join(csv_dir, "rfm_analysis.csv")),
+            "monetary"
+        )
+        rfm_df = rfm_df.sort_values(
+            ["segment", "monetary"],
+            kind="stable"
+        ).reset_index(drop=True)
+
+        self.rfm_df = rfm_df
+        self.monetary = rfm_df["monetary"].to_numpy()
+
+        segments = rfm_df["segment"].to_numpy()
+        names, starts = np.unique(segments, return_index=True)
+        stops = np.append(starts[1:], len(rfm_df))
+
+        self.segment_index = {
+            str(name): (int(start), int(stop))
+            for name, start, stop in zip(names, starts, stops)
+        }
+
+        # -----------------------------
+        # Cohort cells (long format)
+        # -----------------------------
+        sparse_path = os.path.join(csv_dir, COHORT_MATRIX_FILE)
+
+        if os.path.exists(resolve_path(sparse_path)):
+            matrix = load_cohort_matrix(sparse_path)
+            self.cohort_df = pd.DataFrame({
+                "cohort_start": matrix["cohort_start"][matrix["rows"]],
+                "cohort_index": matrix["cols"] + 1,
+                "active_customers": matrix["active"],
+                "retention": matrix["retention"],
+            })
+        else:
+            counts_df = load_table(
+                os.path.join(csv_dir, "cohort_counts.csv"),
+                parse_dates=[0]
+            )
+            counts_df.columns = [
+                "cohort_start", "cohort_index", "active_customers"
+            ]
+            cohort_size = counts_df.loc[
+                counts_df["cohort_index"] == 1
+            ].set_index("cohort_start")["active_customers"]
+            counts_df["retention"] = (
+                counts_df["active_customers"]
+                / counts_df["cohort_start"].map(cohort_size)
+            )
+            self.cohort_df = counts_df
+
+        self.cohort_df = self.cohort_df.sort_values(
+            ["cohort_start", "cohort_index"]
+        ).reset_index(drop=True)
+
+        # -----------------------------
+        # Rollup cube (optional)
+        # -----------------------------
+        cube_path = os.path.join(csv_dir, CUBE_FILE)
+        self.cube = (
+            load_rollup_cube(cube_path)
+            if os.path.exists(resolve_path(cube_path)) else None
+        )
+
+        self.query = lru_cache(maxsize=cache_size)(self._query)
+
+        print("Dashboard data loaded:", len(rfm_df), "customers,",
+              len(self.segment_index), "segments")
+
+    # -----------------------------
+    # Row selection
+    # -----------------------------
+    def _select(self, segments, min_monetary, max_monetary):
+        """
+        Returns row positions for the given segments and monetary range
+        using the per-segment blocks.
+        """
+
+        if not segments:
+            segments = list(self.segment_index)
+
+        blocks = []
+
+        for segment in segments:
+            if segment not in self.segment_index:
+                raise ValueError(f"Unknown segment: {segment!r}")
+
+            start, stop = self.segment_index[segment]
+            block = self.monetary[start:stop]
+
+            lo = 0 if min_monetary is None else np.searchsorted(
+                block, min_monetary, side="left"
+            )
+            hi = len(block) if max_monetary is None else np.searchsorted(
+                block, max_monetary, side="right"
+            )
+            blocks.append(np.arange(start + lo, start + hi))
+
+        return np.concatenate(blocks) if blocks else np.array([], dtype=int)
+
+    # -----------------------------
+    # Queries (cached)
+    # -----------------------------
+    def _query(self, endpoint, params):
+
+        params = dict(params)
+
+        if endpoint == "segments":
+            return self._aggregate((), None, None, "segment")
+
+        if endpoint == "customers":
+            return self._customers(
+                params.get("segment", ()),
+                _float_param(params, "min_monetary"),
+                _float_param(params, "max_monetary"),
+                page=_int_param(params, "page", 1),
+                page_size=_int_param(params, "page_size", 50),
+                ascending=_first(params, "order", "desc") == "asc",
+            )
+
+        if endpoint == "aggregate":
+            return self._aggregate(
+                params.get("segment", ()),
+                _float_param(params, "min_monetary"),
+                _float_param(params, "max_monetary"),
+                _first(params, "by", "segment"),
+            )
+
+        if endpoint == "cohort":
+            return self._cohort(
+                _first(params, "start"),
+                _first(params, "end"),
+                _int_param(params, "max_index", None),
+            )
+
+        if endpoint == "cube":
+            return self._cube(
+                params.get("by", ()),
+                {
+                    dim: params[dim]
+                    for dim in CUBE_DIMENSIONS if dim in params
+                },
+            )
+
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    def _customers(self, segments, min_monetary, max_monetary,
+                   page, page_size, ascending):
+
+        if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError(
+                f"page must be >= 1 and page_size in 1..{MAX_PAGE_SIZE}"
+            )
+
+        rows = self._select(segments, min_monetary, max_monetary)
+
+        # Only the selected rows are sorted, not the whole table
+        order = np.argsort(self.monetary[rows], kind="stable")
+        if not ascending:
+            order = order[::-1]
+
+        start = (page - 1) * page_size
+        page_rows = rows[order[start:start + page_size]]
+
+        customers = self.rfm_df.iloc[page_rows][CUSTOMER_COLUMNS]
+
+        return {
+            "total": int(len(rows)),
+            "page": page,
+            "page_size": page_size,
+            "customers": json.loads(customers.to_json(orient="records")),
+        }
+
+    def _aggregate(self, segments, min_monetary, max_monetary, by):
+
+        if by not in GROUP_BY_COLUMNS:
+            raise ValueError(f"by must be one of {GROUP_BY_COLUMNS}")
+
+        rows = self._select(segments, min_monetary, max_monetary)
+
+        aggregate_df = (
+            self.rfm_df.iloc[rows]
+            .groupby(by)
+            .agg(
+                customer_count=("customer_id", "nunique"),
+                total_revenue=("monetary_minor", "sum"),
+                avg_frequency=("frequency", "mean"),
+            )
+            .reset_index()
+        )
+
+        aggregate_df["total_revenue"] = from_minor_units(
+            aggregate_df["total_revenue"]
+        )
+        aggregate_df["avg_monetary"] = (
+            aggregate_df["total_revenue"] / aggregate_df["customer_count"]
+        )
+
+        return {
+            "by": by,
+            "rows": json.loads(aggregate_df.to_json(orient="records")),
+        }
+
+    def _cube(self, group_by, filters):
+
+        if self.cube is None:
+            raise ValueError("Rollup cube not built; run `main.py cube`.")
+
+        cube_df = self.cube.query(group_by, filters)
+
+        return {
+            "by": list(group_by),
+            "rows": json.loads(
+                cube_df.to_json(orient="records", date_format="iso")
+            ),
+        }
+
+    def _cohort(self, start, end, max_index):
+
+        cohort_df = self.cohort_df
+
+        if start is not None:
+            cohort_df = cohort_df[
+                cohort_df["cohort_start"] >= pd.Timestamp(start)
+            ]
+        if end is not None:
+            cohort_df = cohort_df[
+                cohort_df["cohort_start"] <= pd.Timestamp(end)
+            ]
+        if max_index is not None:
+            cohort_df = cohort_df[cohort_df["cohort_index"] <= max_index]
+
+        return {
+            "cells": json.loads(
+                cohort_df.to_json(orient="records", date_format="iso")
+            ),
+        }
+
+
+# -----------------------------
+# Query string helpers
+# -----------------------------
+def _first(params, name, default=None):
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def _float_param(params, name):
+    value = _first(params, name)
+    return None if value in (None, "") else float(value)
+
+
+def _int_param(params, name, default):
+    value = _first(params, name)
+    return default if value in (None, "") else int(value)
+
+
+def _cache_key(query_string):
+
+    # Sorted, hashable form so equivalent queries share a cache entry
+    parsed = parse_qs(query_string)
+    return tuple(
+        (name, tuple(values)) for name, values in sorted(parsed.items())
+    )
+
+
+class DashboardRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serves /api/<endpoint> queries from DashboardData and every other
+    path as a static file from the dashboard directory.
+    """
+
+    def __init__(self, *args, data=None, **kwargs):
+        self.data = data
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+
+        url = urlparse(self.path)
+
+        if not url.path.startswith("/api/"):
+            return super().do_GET()
+
+        endpoint = url.path[len("/api/"):].strip("/")
+
+        if endpoint not in ENDPOINTS:
+            payload, status = {"error": f"Unknown endpoint: {endpoint}"}, 404
+        else:
+            try:
+                payload = self.data.query(endpoint, _cache_key(url.query))
+                status = 200
+            except ValueError as error:
+                payload, status = {"error": str(error)}, 400
+            except Exception as error:
+                # Internal failures still get a response instead of a
+                # dropped connection
+                payload = {"error": f"{type(error).__name__}: {error}"}
+                status = 500
+
+        body = json.dumps(payload).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_dashboard(csv_dir, static_dir, host="127.0.0.1", port=8000,
+                    cache_size=256):
+    """
+    Starts a local dashboard server. The static dashboard in static_dir
+    is served at / and the JSON query API under /api/:
+
+    - /api/segments
+    - /api/customers?segment=At Risk&min_monetary=500&page=1&page_size=50
+    - /api/aggregate?segment=Lost&by=R_score&max_monetary=100
+    - /api/cohort?start=2011-01-01&end=2011-06-01&max_index=6
+    - /api/cube?by=segment&by=country&invoice_month=2011-01-01
+    """
+
+    data = DashboardData(csv_dir, cache_size=cache_size)
+
+    handler = partial(
+        DashboardRequestHandler,
+        data=data,
+        directory=static_dir
+    )
+
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Dashboard server running at http://{host}:{port}/")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
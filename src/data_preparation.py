@@ -1,6 +1,7 @@
 import os
 import pandas as pd
-
+from src.money import to_minor_units
+from src.table_io import load_table, write_table
 
 
 def prepare_data(input_path, output_path):
@@ -12,7 +13,7 @@ def prepare_data(input_path, output_path):
     # -----------------------------
     # Load raw data
     # -----------------------------
-    df = pd.read_csv(input_path)
+    df = load_table(input_path)
 
     print("Initial shape:", df.shape)
     print("Missing values:")
@@ -45,6 +46,9 @@ def prepare_data(input_path, output_path):
     df["invoice_date"] = df["invoice_date"].dt.normalize()
     df = df.dropna(subset=["invoice_date"])
 
+    # Money as int64 minor units from here on (exact, order-independent sums)
+    df["unit_price_minor"] = to_minor_units(df["unit_price"])
+
     # -----------------------------
     # Remove invalid rows
     # -----------------------------
@@ -59,8 +63,8 @@ def prepare_data(input_path, output_path):
     # Remove negative or zero quantities
     df = df[df["quantity"] > 0]
 
-    # Remove zero or negative prices
-    df = df[df["unit_price"] > 0]
+    # Remove zero or negative prices (including sub-unit prices rounding to 0)
+    df = df[df["unit_price_minor"] > 0]
 
     # Drop duplicated rows if any
     df = df.drop_duplicates()
@@ -68,12 +72,14 @@ def prepare_data(input_path, output_path):
     # -----------------------------
     # Feature creation
     # -----------------------------
-    df["total_price"] = df["quantity"] * df["unit_price"]
+    df["total_price_minor"] = (
+        df["quantity"].astype("int64") * df["unit_price_minor"]
+    )
 
     # -----------------------------
     # Basic validation
     # -----------------------------
-    assert (df["total_price"] > 0).all(), "Found non-positive total_price values."
+    assert (df["total_price_minor"] > 0).all(), "Found non-positive total_price values."
     assert df["customer_id"].isnull().sum() == 0, "Missing customer_id detected."
 
     print("Cleaned shape:", df.shape)
@@ -82,7 +88,7 @@ def prepare_data(input_path, output_path):
     # Save cleaned data
     # -----------------------------
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    df.to_csv(output_path, index=False)
+    write_table(df, output_path, index=False)
 
     print("Processed data saved to:", output_path)
 
@@ -1,9 +1,93 @@
+import numpy as np
 import pandas as pd
 import os
+from src.table_io import load_table, write_table
+from src.money import from_minor_units, with_minor_units
+
+
+def _inter_purchase_features(df):
+    """
+    Per-customer gaps (in days) between consecutive purchase dates, the
+    number of distinct purchase days and the average value of the repeat
+    purchase days (every day after the first).
+
+    Purchases are sorted once by (customer_id, invoice_date), so every
+    customer is a contiguous block and the statistics are segment
+    reductions (np.add.reduceat) over those blocks instead of a
+    groupby().apply per customer.
+    """
+
+    purchases = (
+        df.groupby(["customer_id", "invoice_date"], sort=True)
+        ["total_price_minor"]
+        .sum()
+        .reset_index()
+    )
+
+    customers = purchases["customer_id"].to_numpy()
+    days = (
+        purchases["invoice_date"]
+        .to_numpy(dtype="datetime64[D]")
+        .astype(np.int64)
+    )
+
+    # Block starts: first purchase of each customer
+    is_start = np.ones(len(customers), dtype=bool)
+    is_start[1:] = customers[1:] != customers[:-1]
+    starts = np.flatnonzero(is_start)
+    ends = np.append(starts[1:], len(customers)) - 1
+
+    # Gap to the previous purchase; block starts have no gap
+    gaps = np.zeros(len(days), dtype=np.float64)
+    gaps[1:] = np.diff(days)
+    valid = ~is_start
+
+    gap_count = np.add.reduceat(valid.astype(np.int64), starts)
+    gap_sum = np.add.reduceat(np.where(valid, gaps, 0.0), starts)
+    gap_sq_sum = np.add.reduceat(np.where(valid, gaps ** 2, 0.0), starts)
+
+    revenue = purchases["total_price_minor"].to_numpy(dtype=np.int64)
+    repeat_revenue = np.add.reduceat(np.where(valid, revenue, 0), starts)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_gap = gap_sum / gap_count
+        var_gap = (gap_sq_sum - gap_count * mean_gap ** 2) / (gap_count - 1)
+        repeat_purchase_value = from_minor_units(repeat_revenue) / gap_count
+
+    std_gap = np.sqrt(np.clip(var_gap, 0, None))
+    std_gap[gap_count < 2] = np.nan
+
+    last_gap = np.where(gap_count > 0, gaps[ends], np.nan)
+
+    # Median: sort valid gaps within their block, then pick middle items
+    block = np.cumsum(is_start) - 1
+    order = np.lexsort((gaps[valid], block[valid]))
+    sorted_gaps = gaps[valid][order]
+    offsets = np.cumsum(gap_count) - gap_count
+
+    has_gap = gap_count > 0
+    lower = offsets + (gap_count - 1) // 2
+    upper = offsets + gap_count // 2
+
+    median_gap = np.full(len(starts), np.nan)
+    median_gap[has_gap] = (
+        sorted_gaps[lower[has_gap]] + sorted_gaps[upper[has_gap]]
+    ) / 2
+
+    return pd.DataFrame({
+        "customer_id": customers[starts],
+        "purchase_days": gap_count + 1,
+        "repeat_purchase_value": repeat_purchase_value,
+        "mean_gap_days": mean_gap,
+        "median_gap_days": median_gap,
+        "std_gap_days": std_gap,
+        "last_gap_days": last_gap,
+    })
+
 
 def build_customer_features(input_path, output_path):
 
-    df = pd.read_csv(input_path)
+    df = with_minor_units(load_table(input_path), "total_price")
 
     df["invoice_date"] = pd.to_datetime(df["invoice_date"], errors="coerce")
 
@@ -13,12 +97,19 @@ def build_customer_features(input_path, output_path):
             first_purchase_date=("invoice_date", "min"),
             last_purchase_date=("invoice_date", "max"),
             total_orders=("invoice_no",  "nunique"),
-            total_revenue=("total_price", "sum"),
+            total_revenue_minor=("total_price_minor", "sum"),
             total_quantity=("quantity", "sum")
         )
         .reset_index()
     )
 
+    # Integer sum is exact; the decimal column is for output and ratios
+    customer_df.insert(
+        customer_df.columns.get_loc("total_revenue_minor") + 1,
+        "total_revenue",
+        from_minor_units(customer_df["total_revenue_minor"])
+    )
+
     reference_date = df["invoice_date"].max() + pd.Timedelta(days=1)
 
     customer_df["recency_days"] =(
@@ -56,8 +147,24 @@ def build_customer_features(input_path, output_path):
             customer_df["total_quantity"] / customer_df["total_orders"]
     )
 
+    # -----------------------------
+    # Inter-purchase timing
+    #
+    # overdue_ratio > 1 means the customer has been away longer than
+    # their usual gap between purchases (NaN for one-time buyers).
+    # -----------------------------
+    customer_df = customer_df.merge(
+        _inter_purchase_features(df),
+        on="customer_id",
+        how="left"
+    )
+
+    customer_df["overdue_ratio"] = (
+        customer_df["recency_days"] / customer_df["mean_gap_days"]
+    )
+
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    customer_df.to_csv(output_path, index=False)
+    write_table(customer_df, output_path, index=False)
 
 
     print("Featured dataset saved successfully.")
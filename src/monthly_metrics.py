@@ -1,10 +1,12 @@
 import os
 import pandas as pd
+from src.table_io import load_table, write_table
+from src.money import from_minor_units, with_minor_units
 
 
 def build_monthly_metrics(input_path: str, output_path: str):
 
-    df = pd.read_csv(input_path)
+    df = with_minor_units(load_table(input_path), "total_price")
     os.makedirs(output_path, exist_ok=True)
 
     df["invoice_date"] = pd.to_datetime(df["invoice_date"], errors="coerce")
@@ -19,7 +21,7 @@ def build_monthly_metrics(input_path: str, output_path: str):
     monthly_df = (
         df.groupby("invoice_month")
         .agg(
-            total_revenue=("total_price", "sum"),
+            total_revenue=("total_price_minor", "sum"),
             total_orders=("invoice_no", "nunique"),
             unique_customers=("customer_id", "nunique"),
         )
@@ -27,7 +29,11 @@ def build_monthly_metrics(input_path: str, output_path: str):
         .sort_values("invoice_month")
     )
 
-    monthly_df.to_csv(
+    # Exact integer sums, converted to decimals only for output
+    monthly_df["total_revenue"] = from_minor_units(monthly_df["total_revenue"])
+
+    write_table(
+        monthly_df,
         os.path.join(output_path, "monthly_metrics.csv"),
         index=False
     )
@@ -0,0 +1,164 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src.table_io import load_table, write_table, flush_writes
+from src.money import from_minor_units, with_minor_units
+from src.feature_engineering import build_customer_features
+from src.rfm_analysis import (
+    run_rfm_analysis,
+    build_segment_analysis,
+    write_segment_analysis_table,
+)
+from src.cohort_analysis import run_cohort_analysis
+from src.monthly_metrics import build_monthly_metrics
+
+
+def _partition_dir_name(key, value):
+
+    # Filesystem-safe directory name, e.g. "country=United_Kingdom"
+    safe_value = re.sub(r"[^0-9A-Za-z.-]+", "_", str(value)).strip("_")
+    return f"{key}={safe_value or 'unknown'}"
+
+
+def _run_partition(key, value, partition_df, partition_path, granularity,
+                   write_dense):
+    """
+    Runs the features, RFM, cohort and monthly stages for one partition.
+    Executed in a worker process; returns the partition's summary row and
+    its segment / monthly tables for the combined outputs.
+    """
+
+    tables_path = os.path.join(partition_path, "tables")
+    featured_path = os.path.join(partition_path, "featured.csv")
+
+    # Stages hand their frames on in memory; files are only outputs
+    featured_df = build_customer_features(partition_df, featured_path)
+    rfm_df = run_rfm_analysis(
+        featured_df,
+        tables_path,
+        write_segment_analysis=False
+    )
+    segment_df = build_segment_analysis(rfm_df)
+    write_segment_analysis_table(segment_df, tables_path)
+
+    run_cohort_analysis(
+        partition_df,
+        tables_path,
+        granularity=granularity,
+        write_dense=write_dense
+    )
+    monthly_df = build_monthly_metrics(partition_df, tables_path)
+
+    # Partition files must be on disk before the worker reports back
+    flush_writes()
+
+    summary = {
+        key: value,
+        "customers": partition_df["customer_id"].nunique(),
+        "orders": partition_df["invoice_no"].nunique(),
+        "transactions": len(partition_df),
+        "total_revenue": from_minor_units(
+            partition_df["total_price_minor"].sum()
+        ),
+        "status": "ok",
+    }
+
+    return summary, segment_df, monthly_df
+
+
+def run_partitioned(input_path, output_path, key="country", workers=None,
+                    min_customers=20, granularity="monthly", write_dense=True):
+    """
+    Splits the cleaned transactions by `key` and runs the per-customer
+    stages for every partition in a process pool.
+
+    The cleaned data is parsed once (or passed in directly as a DataFrame)
+    and each worker receives its partition in memory. Outputs are written
+    to <output_path>/<key>=<value>/ plus combined tables at the top level:
+    partition_summary.csv, segment_analysis_by_<key>.csv and
+    monthly_metrics_by_<key>.csv. Partitions with fewer than
+    min_customers customers are skipped, since quintile scoring needs a
+    minimum population. granularity and write_dense are passed to the
+    cohort stage.
+    """
+
+    df = with_minor_units(load_table(input_path), "total_price")
+    os.makedirs(output_path, exist_ok=True)
+
+    if key not in df.columns:
+        raise ValueError(f"Partition key {key!r} not found in dataset.")
+
+    df["invoice_date"] = pd.to_datetime(df["invoice_date"], errors="coerce")
+
+    customers_per_partition = df.groupby(key)["customer_id"].nunique()
+    eligible = customers_per_partition[
+        customers_per_partition >= min_customers
+    ].index
+
+    print("Partitions:", len(customers_per_partition),
+          "| eligible:", len(eligible))
+
+    summaries = [
+        {key: value, "customers": int(count), "status": "skipped"}
+        for value, count in customers_per_partition.items()
+        if value not in eligible
+    ]
+    segment_tables = []
+    monthly_tables = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        futures = {
+            value: executor.submit(
+                _run_partition,
+                key,
+                value,
+                partition_df,
+                os.path.join(output_path, _partition_dir_name(key, value)),
+                granularity,
+                write_dense
+            )
+            for value, partition_df in df[df[key].isin(eligible)].groupby(key)
+        }
+
+        for value, future in futures.items():
+            try:
+                summary, segment_df, monthly_df = future.result()
+            except ValueError as error:
+                summaries.append(
+                    {key: value, "status": f"failed: {error}"}
+                )
+                continue
+
+            summaries.append(summary)
+            segment_tables.append(segment_df.assign(**{key: value}))
+            monthly_tables.append(monthly_df.assign(**{key: value}))
+
+    # -----------------------------
+    # Combined outputs
+    # -----------------------------
+    summary_df = pd.DataFrame(summaries).sort_values(key)
+    write_table(
+        summary_df,
+        os.path.join(output_path, "partition_summary.csv"),
+        index=False
+    )
+
+    if segment_tables:
+        write_table(
+            pd.concat(segment_tables, ignore_index=True),
+            os.path.join(output_path, f"segment_analysis_by_{key}.csv"),
+            index=False
+        )
+        write_table(
+            pd.concat(monthly_tables, ignore_index=True),
+            os.path.join(output_path, f"monthly_metrics_by_{key}.csv"),
+            index=False
+        )
+
+    print("Partitioned outputs saved to:", output_path)
+
+    return summary_df
@@ -0,0 +1,396 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.table_io import load_table, write_table
+from src.money import from_minor_units, with_minor_units
+from src.feature_engineering import build_customer_features
+from src.rfm_analysis import run_rfm_analysis
+from src.cohort_analysis import COHORT_MATRIX_FILE, save_cohort_matrix
+
+
+CI_LEVEL = 0.95
+
+
+# -----------------------------
+# Sampling
+# -----------------------------
+def _sample_customers(df, fraction, rng):
+    """
+    Samples customers (not rows), stratified by country and first
+    purchase month. Every stratum keeps at least one customer; the
+    returned weight is stratum size / sampled customers in the stratum.
+    Strata are numbered in (country, first_purchase_month) order.
+    """
+
+    customers = (
+        df.groupby("customer_id")
+        .agg(
+            country=("country", "first"),
+            first_purchase=("invoice_date", "min"),
+        )
+        .reset_index()
+    )
+    customers["first_purchase_month"] = (
+        customers["first_purchase"].dt.to_period("M").dt.to_timestamp()
+    )
+
+    strata = ["country", "first_purchase_month"]
+    stratum_size = customers.groupby(strata)["customer_id"].transform("size")
+    n_take = np.ceil(stratum_size * fraction).astype(int).clip(lower=1)
+
+    # Weights must match the customers actually sampled
+    n_take = np.minimum(n_take, stratum_size)
+
+    # Random order, then keep the first n_take customers of each stratum
+    customers["_key"] = rng.random(len(customers))
+    customers = customers.sort_values("_key")
+    position = customers.groupby(strata).cumcount()
+    keep = position < n_take.loc[customers.index]
+
+    sample = customers.loc[keep].copy()
+    sample["stratum_size"] = stratum_size.loc[sample.index]
+    sample["weight"] = sample["stratum_size"] / n_take.loc[sample.index]
+    sample["stratum"] = sample.groupby(strata).ngroup()
+
+    return (
+        sample.sort_values(["stratum", "customer_id"])
+        [["customer_id", "country", "stratum", "stratum_size", "weight"]]
+        .reset_index(drop=True)
+    )
+
+
+def _variance_strata(sample):
+    """
+    Variance strata for the bootstrap. A stratum with one sampled
+    customer carries no variance information, so consecutive months of
+    the same country are merged until every group holds at least two
+    sampled customers; countries sampled only once are pooled together.
+    Returns a group code per sampled customer.
+    """
+
+    strata = sample.groupby("stratum").agg(
+        country=("country", "first"),
+        sampled=("customer_id", "size"),
+    )
+
+    group_of = {}
+    closed = []
+    pooled = []
+
+    for _, country_strata in strata.groupby("country", sort=False):
+        current, count = [], 0
+
+        for stratum, sampled in country_strata["sampled"].items():
+            current.append(stratum)
+            count += sampled
+
+            if count >= 2:
+                closed.append(current)
+                current, count = [], 0
+
+        # A trailing singleton joins the country's previous group
+        if current and closed and strata.loc[closed[-1][0], "country"] == (
+            strata.loc[current[0], "country"]
+        ):
+            closed[-1].extend(current)
+        else:
+            pooled.extend(current)
+
+    if pooled:
+        if len(pooled) == 1 and closed:
+            closed[-1].extend(pooled)
+        else:
+            closed.append(pooled)
+
+    for group, members in enumerate(closed):
+        for stratum in members:
+            group_of[stratum] = group
+
+    return sample["stratum"].map(group_of).to_numpy()
+
+
+def _bootstrap_multipliers(groups, sampling_fraction, n_boot, rng):
+    """
+    Rao-Wu rescaling bootstrap. Each replicate draws n_h - 1 customers
+    with replacement in every variance stratum h, and the draw counts c
+    become weight multipliers 1 - l + l * c * n_h / (n_h - 1) with
+    l = sqrt(1 - f_h). This reproduces the without-replacement variance,
+    finite population correction included (a full census gives zero
+    width intervals). Returns an (n_boot x n_customers) matrix.
+    """
+
+    n = len(groups)
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+
+    offsets = np.searchsorted(sorted_groups, sorted_groups, side="left")
+    sizes = np.searchsorted(sorted_groups, sorted_groups, side="right")
+    sizes = sizes - offsets
+
+    # n_h - 1 draws per stratum: the first slot of every stratum is unused
+    draw_slots = np.arange(n) != offsets
+    draws = offsets[draw_slots] + (
+        rng.random((n_boot, draw_slots.sum())) * sizes[draw_slots]
+    ).astype(np.int64)
+    flat = (np.arange(n_boot)[:, None] * n + draws).ravel()
+    counts = np.bincount(flat, minlength=n_boot * n).reshape(n_boot, n)
+
+    scale = np.sqrt(1 - sampling_fraction[order])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        multipliers = 1 - scale + scale * counts * sizes / (sizes - 1)
+
+    # A stratum that could not be collapsed (n_h == 1) adds no variance
+    multipliers[:, sizes < 2] = 1
+
+    result = np.empty_like(multipliers)
+    result[:, order] = multipliers
+
+    return result
+
+
+def _indicator(rows, cols, values, shape):
+    return sparse.csr_matrix((values, (rows, cols)), shape=shape)
+
+
+def _add_ci(df, column, replicates):
+
+    alpha = (1 - CI_LEVEL) / 2
+    df[f"{column}_ci_low"] = np.nanquantile(replicates, alpha, axis=0)
+    df[f"{column}_ci_high"] = np.nanquantile(replicates, 1 - alpha, axis=0)
+
+
+# -----------------------------
+# Preview runner
+# -----------------------------
+def run_preview(input_path, output_path, fraction=0.1, n_boot=200, seed=0):
+    """
+    Runs the pipeline on a stratified customer sample and scales the
+    results back to the full population.
+
+    Features and RFM scoring run unchanged on the sample. Sampled
+    customers carry weight stratum size / stratum sample size, and the
+    segment, monthly and cohort tables are built as weighted sums so they
+    estimate population totals. segment_analysis.csv and
+    monthly_metrics.csv get bootstrap confidence intervals
+    (<column>_ci_low / <column>_ci_high) and retention_ci.csv holds the
+    retention cells with their intervals. Segments are assigned once on
+    the sample and held fixed across bootstrap replicates.
+    """
+
+    if not 0 < fraction <= 1:
+        raise ValueError(f"fraction must be in (0, 1], got {fraction}.")
+
+    rng = np.random.default_rng(seed)
+
+    df = with_minor_units(load_table(input_path), "total_price")
+    df["invoice_date"] = pd.to_datetime(df["invoice_date"], errors="coerce")
+
+    tables_path = os.path.join(output_path, "tables")
+    featured_path = os.path.join(output_path, "featured.csv")
+
+    sample = _sample_customers(df, fraction, rng)
+    sample_df = (
+        df[df["customer_id"].isin(sample["customer_id"])]
+        .reset_index(drop=True)
+    )
+
+    print("Preview sample:", len(sample), "of",
+          df["customer_id"].nunique(), "customers,",
+          len(sample_df), "transactions")
+
+    # -----------------------------
+    # Run the pipeline on the sample
+    # -----------------------------
+    # Frames are passed on in memory; the weighted segment table below
+    # replaces RFM's unweighted one
+    featured_df = build_customer_features(sample_df, featured_path)
+    rfm_df = run_rfm_analysis(
+        featured_df,
+        tables_path,
+        write_segment_analysis=False
+    )
+
+    # -----------------------------
+    # Per-customer contributions
+    # -----------------------------
+    n = len(sample)
+    customer_index = pd.Index(sample["customer_id"])
+    weights = sample["weight"].to_numpy()
+
+    groups = _variance_strata(sample)
+    design_strata = sample.drop_duplicates("stratum")
+    population = design_strata.groupby(
+        groups[design_strata.index]
+    )["stratum_size"].sum()
+    sampling_fraction = (
+        np.bincount(groups) / population.sort_index().to_numpy()
+    )[groups]
+
+    multipliers = _bootstrap_multipliers(
+        groups, sampling_fraction, n_boot, rng
+    )
+    weighted = np.vstack([weights, multipliers * weights])
+
+    rfm_df = rfm_df.set_index("customer_id").reindex(customer_index)
+    segment_codes, segment_names = pd.factorize(rfm_df["segment"], sort=True)
+
+    rows = np.arange(n)
+    segment_shape = (n, len(segment_names))
+    ones = _indicator(rows, segment_codes, np.ones(n), segment_shape)
+    monetary = _indicator(
+        rows, segment_codes, rfm_df["monetary"].to_numpy(), segment_shape
+    )
+    frequency = _indicator(
+        rows, segment_codes, rfm_df["frequency"].to_numpy(), segment_shape
+    )
+
+    # Row 0 is the point estimate, the rest are bootstrap replicates
+    customer_count = (ones.T @ weighted.T).T
+    total_revenue = (monetary.T @ weighted.T).T
+    total_frequency = (frequency.T @ weighted.T).T
+
+    segment_estimates = {
+        "customer_count": customer_count,
+        "total_revenue": total_revenue,
+        "avg_frequency": total_frequency / customer_count,
+        "avg_monetary": total_revenue / customer_count,
+    }
+
+    segment_df = pd.DataFrame({"segment": segment_names})
+    for column, values in segment_estimates.items():
+        segment_df[column] = values[0]
+        _add_ci(segment_df, column, values[1:])
+
+    write_table(
+        segment_df,
+        os.path.join(tables_path, "segment_analysis.csv"),
+        index=False
+    )
+
+    # -----------------------------
+    # Monthly metrics
+    # -----------------------------
+    month = sample_df["invoice_date"].dt.to_period("M").dt.to_timestamp()
+    month_codes, months = pd.factorize(month, sort=True)
+    customer_rows = customer_index.get_indexer(sample_df["customer_id"])
+    month_shape = (n, len(months))
+
+    revenue = _indicator(
+        customer_rows,
+        month_codes,
+        from_minor_units(sample_df["total_price_minor"].to_numpy()),
+        month_shape
+    )
+
+    invoices = sample_df.drop_duplicates("invoice_no")
+    orders = _indicator(
+        customer_index.get_indexer(invoices["customer_id"]),
+        month_codes[invoices.index.to_numpy()],
+        np.ones(len(invoices)),
+        month_shape
+    )
+
+    # Binary active flag per (customer, month)
+    active = _indicator(
+        customer_rows,
+        month_codes,
+        np.ones(len(customer_rows)),
+        month_shape
+    )
+    active.data[:] = 1
+
+    monthly_estimates = {
+        "total_revenue": (revenue.T @ weighted.T).T,
+        "total_orders": (orders.T @ weighted.T).T,
+        "unique_customers": (active.T @ weighted.T).T,
+    }
+
+    monthly_df = pd.DataFrame({"invoice_month": months})
+    for column, values in monthly_estimates.items():
+        monthly_df[column] = values[0]
+        _add_ci(monthly_df, column, values[1:])
+
+    write_table(
+        monthly_df,
+        os.path.join(tables_path, "monthly_metrics.csv"),
+        index=False
+    )
+
+    # -----------------------------
+    # Cohort retention
+    # -----------------------------
+    month_ordinal = (
+        sample_df["invoice_date"].dt.to_period("M").array.asi8
+    )
+    first_month = np.full(n, np.iinfo(np.int64).max)
+    np.minimum.at(first_month, customer_rows, month_ordinal)
+
+    cohort_index = month_ordinal - first_month[customer_rows]
+    cohort_codes, cohort_ordinals = pd.factorize(
+        first_month[customer_rows], sort=True
+    )
+    cohort_starts = pd.PeriodIndex.from_ordinals(
+        cohort_ordinals, freq="M"
+    ).to_timestamp()
+
+    n_index = int(cohort_index.max()) + 1
+    cell_shape = (n, len(cohort_ordinals) * n_index)
+
+    # Binary active flag per (customer, cohort cell)
+    cells = _indicator(
+        customer_rows,
+        cohort_codes * n_index + cohort_index,
+        np.ones(len(customer_rows)),
+        cell_shape
+    )
+    cells.data[:] = 1
+
+    cell_active = (cells.T @ weighted.T).T
+    cell_cohort = np.arange(cell_shape[1]) // n_index
+    cohort_size = cell_active[:, cell_cohort * n_index]
+
+    observed = np.flatnonzero(cell_active[0] > 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        retention = cell_active[:, observed] / cohort_size[:, observed]
+
+    retention_df = pd.DataFrame({
+        "cohort_month": cohort_starts[cell_cohort[observed]],
+        "cohort_index": observed % n_index + 1,
+        "active_customers": cell_active[0, observed],
+        "retention": retention[0],
+    })
+    _add_ci(retention_df, "retention", retention[1:])
+
+    write_table(
+        retention_df,
+        os.path.join(tables_path, "retention_ci.csv"),
+        index=False
+    )
+
+    # Scaled counts so plots and dashboard show population estimates
+    cohort_counts_df = retention_df[["cohort_month", "cohort_index"]].copy()
+    cohort_counts_df["active_customers"] = (
+        np.rint(retention_df["active_customers"]).astype(np.int64)
+    )
+
+    write_table(
+        cohort_counts_df,
+        os.path.join(tables_path, "cohort_counts.csv"),
+        index=False
+    )
+
+    save_cohort_matrix(
+        os.path.join(tables_path, COHORT_MATRIX_FILE),
+        cohort_start=cohort_starts.values,
+        rows=cell_cohort[observed],
+        cols=observed % n_index,
+        active=cohort_counts_df["active_customers"].to_numpy(),
+        granularity="monthly",
+    )
+
+    print("Preview tables saved to:", tables_path)
+
+    return segment_df, monthly_df, retention_df
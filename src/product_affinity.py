@@ -0,0 +1,204 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from src.table_io import load_table, write_table, write_npz
+from src.money import from_minor_units, with_minor_units
+
+
+def build_interaction_matrices(df):
+    """
+    Encodes customer_id and stock_code as dense integer ids and builds
+    customer x product CSR matrices weighted by quantity and revenue
+    (revenue in int64 minor units, so per-cell sums are exact).
+
+    Repeated (customer, product) rows are summed by the sparse
+    constructor, so the whole build is a single vectorized pass.
+    """
+
+    customer_codes, customer_ids = pd.factorize(df["customer_id"], sort=True)
+    product_codes, stock_codes = pd.factorize(
+        df["stock_code"].astype(str), sort=True
+    )
+
+    shape = (len(customer_ids), len(stock_codes))
+    coords = (customer_codes, product_codes)
+
+    quantity_matrix = sparse.csr_matrix(
+        (df["quantity"].to_numpy(dtype=np.int64), coords),
+        shape=shape
+    )
+    revenue_matrix = sparse.csr_matrix(
+        (df["total_price_minor"].to_numpy(dtype=np.int64), coords),
+        shape=shape
+    )
+
+    return quantity_matrix, revenue_matrix, customer_ids, stock_codes
+
+
+def _top_k_per_row(matrix, k):
+    """
+    Returns (row, col, value, rank) of the k largest entries in every row
+    of a sparse matrix, ordered by row then descending value.
+    """
+
+    coo = matrix.tocoo()
+    order = np.lexsort((-coo.data, coo.row))
+
+    rows = coo.row[order]
+    cols = coo.col[order]
+    values = coo.data[order]
+
+    # Position of each entry within its row
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side="left")
+    keep = rank < k
+
+    return rows[keep], cols[keep], values[keep], rank[keep] + 1
+
+
+def run_product_affinity(input_path, rfm_path, output_path,
+                         top_pairs=50, top_partners=10, top_products=10):
+    """
+    Builds the customer x product interaction matrices and derives:
+
+    - product_pairs.csv: top co-purchased product pairs overall
+    - frequently_bought_together.csv: top partners for every product
+    - segment_product_ranking.csv: top products per RFM segment
+
+    Co-purchase counts come from B.T @ B, where B is the binary
+    customer x product matrix, so memory stays proportional to the number
+    of non-zeros rather than customers x products.
+    """
+
+    df = with_minor_units(load_table(input_path), "total_price")
+    os.makedirs(output_path, exist_ok=True)
+
+    quantity_matrix, revenue_matrix, customer_ids, stock_codes = (
+        build_interaction_matrices(df)
+    )
+
+    print("Interaction matrix:", quantity_matrix.shape,
+          "| non-zeros:", quantity_matrix.nnz)
+
+    for name, matrix in [
+        ("interaction_quantity.npz", quantity_matrix),
+        ("interaction_revenue.npz", revenue_matrix),
+    ]:
+        write_npz(os.path.join(output_path, name), sparse.save_npz, matrix)
+
+    descriptions = (
+        df.assign(stock_code=df["stock_code"].astype(str))
+        .groupby("stock_code")["description"]
+        .first()
+        .reindex(stock_codes)
+        .to_numpy()
+    )
+
+    # -----------------------------
+    # Co-purchase counts (customers who bought both products)
+    # -----------------------------
+    bought = (quantity_matrix > 0).astype(np.int32)
+    product_customers = np.asarray(bought.sum(axis=0)).ravel()
+    n_customers = bought.shape[0]
+
+    co_purchase = (bought.T @ bought).tocsr()
+    co_purchase.setdiag(0)
+    co_purchase.eliminate_zeros()
+
+    # -----------------------------
+    # Top pairs overall (upper triangle, each pair once)
+    # -----------------------------
+    upper = sparse.triu(co_purchase, k=1).tocoo()
+
+    if upper.nnz > top_pairs:
+        top = np.argpartition(-upper.data, top_pairs - 1)[:top_pairs]
+    else:
+        top = np.arange(upper.nnz)
+
+    top = top[np.argsort(-upper.data[top], kind="stable")]
+    a, b, both = upper.row[top], upper.col[top], upper.data[top]
+
+    pairs_df = pd.DataFrame({
+        "stock_code_a": stock_codes[a],
+        "description_a": descriptions[a],
+        "stock_code_b": stock_codes[b],
+        "description_b": descriptions[b],
+        "co_customers": both,
+        "support": both / n_customers,
+        "lift": both * n_customers
+        / (product_customers[a] * product_customers[b]),
+    })
+
+    write_table(
+        pairs_df,
+        os.path.join(output_path, "product_pairs.csv"),
+        index=False
+    )
+
+    # -----------------------------
+    # Frequently bought together, per product
+    # -----------------------------
+    rows, cols, counts, rank = _top_k_per_row(co_purchase, top_partners)
+
+    partners_df = pd.DataFrame({
+        "stock_code": stock_codes[rows],
+        "rank": rank,
+        "partner_stock_code": stock_codes[cols],
+        "partner_description": descriptions[cols],
+        "co_customers": counts,
+        "confidence": counts / product_customers[rows],
+    })
+
+    write_table(
+        partners_df,
+        os.path.join(output_path, "frequently_bought_together.csv"),
+        index=False
+    )
+
+    # -----------------------------
+    # Product ranking per RFM segment
+    # -----------------------------
+    segments = (
+        load_table(rfm_path, usecols=["customer_id", "segment"])
+        .set_index("customer_id")["segment"]
+        .reindex(customer_ids)
+    )
+    segment_codes, segment_names = pd.factorize(segments, sort=True)
+    has_segment = segment_codes >= 0
+
+    # Segment x customer indicator, so segment totals are one product
+    segment_matrix = sparse.csr_matrix(
+        (
+            np.ones(has_segment.sum(), dtype=np.int64),
+            (segment_codes[has_segment], np.flatnonzero(has_segment))
+        ),
+        shape=(len(segment_names), n_customers)
+    )
+
+    segment_revenue = segment_matrix @ revenue_matrix
+    segment_quantity = (segment_matrix @ quantity_matrix).tocsr()
+    segment_customers = (segment_matrix @ bought).tocsr()
+
+    rows, cols, revenue, rank = _top_k_per_row(segment_revenue, top_products)
+
+    ranking_df = pd.DataFrame({
+        "segment": segment_names[rows],
+        "rank": rank,
+        "stock_code": stock_codes[cols],
+        "description": descriptions[cols],
+        "revenue": from_minor_units(revenue),
+        "quantity": np.asarray(segment_quantity[rows, cols])
+        .ravel().astype(np.int64),
+        "customers": np.asarray(segment_customers[rows, cols])
+        .ravel().astype(np.int64),
+    })
+
+    write_table(
+        ranking_df,
+        os.path.join(output_path, "segment_product_ranking.csv"),
+        index=False
+    )
+
+    print("Product affinity tables saved to:", output_path)
+
+    return ranking_df
@@ -1,34 +1,44 @@
 import pandas as pd
 import os
+from src.table_io import load_table, write_table
+from src.money import from_minor_units, with_minor_units
 
 
-def run_rfm_analysis(input_path, output_path):
+def run_rfm_analysis(input_path, output_path, write_segment_analysis=True):
     """
     Builds RFM scores and customer segments from customer-level feature dataset.
     Uses rank-based quantile scoring to avoid duplicated bin issues.
+    segment_analysis.csv can be skipped when the rollup cube writes it.
     """
 
     # -----------------------------
     # Load featured dataset
     # -----------------------------
-    df = pd.read_csv(input_path)
+    df = with_minor_units(load_table(input_path), "total_revenue")
     os.makedirs(output_path, exist_ok=True)
 
     # -----------------------------
     # Select RFM base columns
     # -----------------------------
     rfm_df = df[
-        ["customer_id", "recency_days", "total_orders", "total_revenue"]
+        ["customer_id", "recency_days", "total_orders", "total_revenue_minor"]
     ].copy()
 
     rfm_df = rfm_df.rename(
         columns={
             "recency_days": "recency",
             "total_orders": "frequency",
-            "total_revenue": "monetary",
+            "total_revenue_minor": "monetary_minor",
         }
     )
 
+    # Scoring and sums use exact integer minor units; decimal for output
+    rfm_df.insert(
+        rfm_df.columns.get_loc("monetary_minor"),
+        "monetary",
+        from_minor_units(rfm_df["monetary_minor"])
+    )
+
     print("RFM base shape:", rfm_df.shape)
     print(rfm_df.head())
 
@@ -63,9 +73,9 @@ def run_rfm_analysis(input_path, output_path):
     # -----------------------------
     # Monetary score (higher spending = better customer)
     #
-    # Same rank-based strategy
+    # Same rank-based strategy, on integer minor units so ties are exact
     # -----------------------------
-    rfm_df["monetary_rank"] = rfm_df["monetary"].rank(method="first")
+    rfm_df["monetary_rank"] = rfm_df["monetary_minor"].rank(method="first")
 
     rfm_df["M_score"] = pd.qcut(
         rfm_df["monetary_rank"],
@@ -131,25 +141,54 @@ def run_rfm_analysis(input_path, output_path):
     # -----------------------------
     # Save outputs
     # -----------------------------
-    rfm_df.to_csv(
+    write_table(
+        rfm_df,
         os.path.join(output_path, "rfm_analysis.csv"),
         index=False
     )
 
     print("RFM analysis saved to:", output_path)
 
+    if write_segment_analysis:
+        write_segment_analysis_table(
+            build_segment_analysis(rfm_df),
+            output_path
+        )
+
+    return rfm_df
+
+
+def build_segment_analysis(rfm_df):
+    """
+    Per-segment customer count, revenue, average frequency and average
+    monetary value from the scored RFM table.
+    """
+
     segment_analysis_df = (
         rfm_df.groupby("segment")
         .agg(
             customer_count=("customer_id", "nunique"),
-            total_revenue=("monetary", "sum"),
+            total_revenue=("monetary_minor", "sum"),
             avg_frequency=("frequency", "mean"),
-            avg_monetary=("monetary", "mean"),
         )
         .reset_index()
     )
 
-    segment_analysis_df.to_csv(
+    segment_analysis_df["total_revenue"] = from_minor_units(
+        segment_analysis_df["total_revenue"]
+    )
+    segment_analysis_df["avg_monetary"] = (
+        segment_analysis_df["total_revenue"]
+        / segment_analysis_df["customer_count"]
+    )
+
+    return segment_analysis_df
+
+
+def write_segment_analysis_table(segment_analysis_df, output_path):
+
+    write_table(
+        segment_analysis_df,
         os.path.join(output_path, "segment_analysis.csv"),
         index=False
     )
@@ -0,0 +1,395 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from src.table_io import load_table, write_table, write_npz, resolve_path
+from src.money import from_minor_units, with_minor_units
+
+
+# -----------------------------
+# Cube layout
+#
+# One row per non-empty (invoice_month, segment, country) cell. Revenue,
+# quantity and invoice counts are additive across cells (an invoice has a
+# single customer, date and country). Distinct customers are not, so
+# every cell also keeps a mergeable customer sketch:
+#
+# - "exact": sparse cell x customer indicator; merging is a union
+# - "hll": HyperLogLog registers; merging is an element-wise max
+#
+# An HLL cell stores 2 ** precision one-byte registers whatever its
+# customer count, with a relative error of about 1.04 / sqrt(2 ** precision)
+# (1.6% at precision 12). The exact sketch stores one entry per customer
+# in the cell, so it is usually smaller unless cells hold many thousands
+# of customers.
+# -----------------------------
+CUBE_DIMENSIONS = ["invoice_month", "segment", "country"]
+CUBE_MEASURES = ["revenue_minor", "quantity", "invoices"]
+CUBE_FILE = "rollup_cube.npz"
+
+HLL_PRECISION = 12
+HLL_PRECISION_RANGE = (4, 18)
+
+
+def _bit_length(values):
+
+    # Vectorized int.bit_length for uint64 arrays
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = values >= np.uint64(1 << shift)
+        length[big] += shift
+        values[big] >>= np.uint64(shift)
+
+    return length + (values > 0)
+
+
+def _hll_registers(cell_codes, customer_ids, n_cells, precision):
+    """
+    HyperLogLog registers per cell. Customers are hashed by id (not by a
+    per-cube code), so registers from different cubes stay mergeable.
+    """
+
+    hashes = pd.util.hash_array(np.asarray(customer_ids))
+    suffix_bits = 64 - precision
+
+    bucket = (hashes >> np.uint64(suffix_bits)).astype(np.int64)
+    suffix = hashes & np.uint64((1 << suffix_bits) - 1)
+    rank = suffix_bits - _bit_length(suffix) + 1
+
+    registers = np.zeros((n_cells, 1 << precision), dtype=np.uint8)
+    np.maximum.at(registers, (cell_codes, bucket), rank.astype(np.uint8))
+
+    return registers
+
+
+def _hll_estimate(registers):
+
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+
+    raw = alpha * m * m / np.sum(
+        np.exp2(-registers.astype(np.float64)), axis=1
+    )
+    zeros = np.sum(registers == 0, axis=1)
+
+    # Linear counting for small cardinalities
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / zeros)
+
+    estimate = np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+    return np.rint(estimate).astype(np.int64)
+
+
+class RollupCube:
+    """
+    Materialized (invoice_month, segment, country) rollup with additive
+    measures and per-cell distinct-customer sketches.
+
+    query() answers any slice / roll-up over the three dimensions from
+    the cells alone, without touching transactions.
+    """
+
+    def __init__(self, cells, sketch):
+
+        self.cells = cells.reset_index(drop=True)
+        self.sketch = sketch
+        self.kind = "exact" if sparse.issparse(sketch) else "hll"
+
+    def _select(self, filters):
+
+        mask = np.ones(len(self.cells), dtype=bool)
+
+        for dim, values in (filters or {}).items():
+            if isinstance(values, str) or np.isscalar(values):
+                values = [values]
+            if dim == "invoice_month":
+                values = pd.to_datetime(list(values))
+            mask &= self.cells[dim].isin(values).to_numpy()
+
+        return np.flatnonzero(mask)
+
+    def _distinct_customers(self, selected, group_codes, n_groups):
+
+        if self.kind == "exact":
+            # Group x cell indicator times cell x customer indicator:
+            # stored entries per row are the distinct customers
+            groups = sparse.csr_matrix(
+                (
+                    np.ones(len(selected), dtype=np.int32),
+                    (group_codes, np.arange(len(selected)))
+                ),
+                shape=(n_groups, len(selected))
+            )
+            merged = (groups @ self.sketch[selected]).tocsr()
+            return np.diff(merged.indptr).astype(np.int64)
+
+        if not len(selected):
+            return np.zeros(n_groups, dtype=np.int64)
+
+        order = np.argsort(group_codes, kind="stable")
+        starts = np.searchsorted(group_codes[order], np.arange(n_groups))
+        merged = np.maximum.reduceat(
+            self.sketch[selected[order]], starts, axis=0
+        )
+
+        return _hll_estimate(merged)
+
+    def query(self, group_by=(), filters=None):
+        """
+        Rolls the cube up to `group_by` (any subset of CUBE_DIMENSIONS,
+        empty for a grand total) after keeping cells whose dimensions
+        match `filters`, e.g. {"country": ["France", "EIRE"]}.
+
+        Returns total_revenue, total_quantity, total_orders and
+        unique_customers per group.
+        """
+
+        group_by = list(group_by)
+        unknown = (set(group_by) | set(filters or {})) - set(CUBE_DIMENSIONS)
+
+        if unknown:
+            raise ValueError(
+                f"Unknown cube dimensions {sorted(unknown)}; "
+                f"expected {CUBE_DIMENSIONS}."
+            )
+
+        selected = self._select(filters)
+        cells = self.cells.iloc[selected]
+
+        if group_by:
+            grouped = cells.groupby(group_by, sort=True, dropna=False)
+            group_codes = grouped.ngroup().to_numpy()
+            result_df = grouped[CUBE_MEASURES].sum().reset_index()
+        else:
+            group_codes = np.zeros(len(cells), dtype=np.int64)
+            result_df = pd.DataFrame([cells[CUBE_MEASURES].sum()])
+
+        result_df["unique_customers"] = self._distinct_customers(
+            selected, group_codes, len(result_df)
+        )
+
+        result_df = result_df.rename(columns={
+            "quantity": "total_quantity",
+            "invoices": "total_orders",
+        })
+        result_df.insert(
+            len(group_by),
+            "total_revenue",
+            from_minor_units(result_df.pop("revenue_minor"))
+        )
+
+        return result_df
+
+    def save(self, path):
+
+        arrays = {
+            "invoice_month": self.cells["invoice_month"].to_numpy(
+                dtype="datetime64[D]"
+            ),
+            "segment": self.cells["segment"].to_numpy(dtype=str),
+            "country": self.cells["country"].to_numpy(dtype=str),
+            **{
+                measure: self.cells[measure].to_numpy(dtype=np.int64)
+                for measure in CUBE_MEASURES
+            },
+            "kind": np.array(self.kind),
+        }
+
+        if self.kind == "exact":
+            arrays["indptr"] = self.sketch.indptr
+            arrays["indices"] = self.sketch.indices
+            arrays["n_customers"] = np.array(self.sketch.shape[1])
+        else:
+            arrays["registers"] = self.sketch
+
+        return write_npz(path, np.savez_compressed, **arrays)
+
+
+def load_rollup_cube(path):
+
+    with np.load(resolve_path(path)) as data:
+        arrays = {key: data[key] for key in data.files}
+
+    cells = pd.DataFrame({
+        "invoice_month": pd.to_datetime(arrays["invoice_month"]),
+        "segment": arrays["segment"].astype(object),
+        "country": arrays["country"].astype(object),
+        **{measure: arrays[measure] for measure in CUBE_MEASURES},
+    })
+
+    if str(arrays["kind"]) == "exact":
+        indices = arrays["indices"]
+        sketch = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int8), indices, arrays["indptr"]),
+            shape=(len(cells), int(arrays["n_customers"]))
+        )
+    else:
+        sketch = arrays["registers"]
+
+    return RollupCube(cells, sketch)
+
+
+def _cube_cells(df, segments):
+    """
+    One grouped pass over cleaned transactions: returns the transactions
+    with cube dimensions, the cell table and the cell code of every row.
+    """
+
+    df = with_minor_units(df, "total_price").assign(
+        invoice_month=pd.to_datetime(df["invoice_date"], errors="coerce")
+        .dt.to_period("M")
+        .dt.to_timestamp(),
+        segment=df["customer_id"].map(segments).fillna("Unclassified"),
+    )
+
+    grouped = df.groupby(CUBE_DIMENSIONS, sort=True, dropna=False)
+    cell_codes = grouped.ngroup().to_numpy()
+
+    cells = grouped.agg(
+        revenue_minor=("total_price_minor", "sum"),
+        quantity=("quantity", "sum"),
+        invoices=("invoice_no", "nunique"),
+    ).reset_index()
+
+    return df, cells, cell_codes
+
+
+def _exact_sketch(cell_codes, customer_ids, n_cells):
+
+    customer_codes, uniques = pd.factorize(customer_ids)
+    customer_sketch = sparse.csr_matrix(
+        (
+            np.ones(len(customer_codes), dtype=np.int8),
+            (cell_codes, customer_codes)
+        ),
+        shape=(n_cells, len(uniques))
+    )
+
+    # Repeated (cell, customer) rows only mark membership
+    customer_sketch.sum_duplicates()
+    customer_sketch.data[:] = 1
+
+    return customer_sketch
+
+
+def _customer_sketch(sketch, df, cells, cell_codes, hll_precision):
+
+    if sketch == "exact":
+        return _exact_sketch(cell_codes, df["customer_id"], len(cells))
+
+    return _hll_registers(
+        cell_codes, df["customer_id"].to_numpy(), len(cells), hll_precision
+    )
+
+
+def _check_sketch(sketch, hll_precision):
+
+    if sketch not in ("exact", "hll"):
+        raise ValueError(f"Unknown sketch {sketch!r}; expected exact or hll.")
+
+    low, high = HLL_PRECISION_RANGE
+    if not low <= hll_precision <= high:
+        raise ValueError(
+            f"hll_precision must be in {low}..{high}, got {hll_precision}."
+        )
+
+
+def build_rollup_cube(df, segments, sketch="exact",
+                      hll_precision=HLL_PRECISION):
+    """
+    Builds the cube in one grouped pass over cleaned transactions.
+    `segments` maps customer_id to its RFM segment.
+    """
+
+    _check_sketch(sketch, hll_precision)
+    df, cells, cell_codes = _cube_cells(df, segments)
+
+    return RollupCube(
+        cells,
+        _customer_sketch(sketch, df, cells, cell_codes, hll_precision)
+    )
+
+
+# -----------------------------
+# Derived views
+# -----------------------------
+def monthly_metrics_view(cube):
+
+    return cube.query(["invoice_month"])[
+        ["invoice_month", "total_revenue", "total_orders", "unique_customers"]
+    ]
+
+
+def segment_analysis_view(cube):
+
+    segment_df = cube.query(["segment"])
+
+    segment_analysis_df = pd.DataFrame({
+        "segment": segment_df["segment"],
+        "customer_count": segment_df["unique_customers"],
+        "total_revenue": segment_df["total_revenue"],
+        "avg_frequency": (
+            segment_df["total_orders"] / segment_df["unique_customers"]
+        ),
+    })
+    segment_analysis_df["avg_monetary"] = (
+        segment_analysis_df["total_revenue"]
+        / segment_analysis_df["customer_count"]
+    )
+
+    return segment_analysis_df
+
+
+def run_rollup_cube(input_path, rfm_path, output_path, sketch="exact",
+                    hll_precision=HLL_PRECISION):
+    """
+    Builds the (invoice_month, segment, country) rollup cube from the
+    cleaned transactions and RFM segments, saves it as rollup_cube.npz
+    and writes monthly_metrics.csv and segment_analysis.csv as views of
+    it. With sketch="hll" the saved cube's distinct-customer counts are
+    approximate; the two views always come from the exact sketch.
+    """
+
+    _check_sketch(sketch, hll_precision)
+
+    df = load_table(input_path)
+    os.makedirs(output_path, exist_ok=True)
+
+    segments = (
+        load_table(rfm_path, usecols=["customer_id", "segment"])
+        .set_index("customer_id")["segment"]
+    )
+
+    df, cells, cell_codes = _cube_cells(df, segments)
+
+    exact_cube = RollupCube(
+        cells,
+        _exact_sketch(cell_codes, df["customer_id"], len(cells))
+    )
+    cube = exact_cube if sketch == "exact" else RollupCube(
+        cells,
+        _customer_sketch(sketch, df, cells, cell_codes, hll_precision)
+    )
+
+    print("Rollup cube:", len(cube.cells), "cells |", cube.kind, "sketch")
+
+    cube.save(os.path.join(output_path, CUBE_FILE))
+
+    # Canonical tables need exact distinct counts
+    write_table(
+        monthly_metrics_view(exact_cube),
+        os.path.join(output_path, "monthly_metrics.csv"),
+        index=False
+    )
+    write_table(
+        segment_analysis_view(exact_cube),
+        os.path.join(output_path, "segment_analysis.csv"),
+        index=False
+    )
+
+    print("Rollup cube and views saved to:", output_path)
+
+    return cube
@@ -0,0 +1,235 @@
+import os
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+
+
+# -----------------------------
+# Shared output writer
+#
+# Tables are written on a background thread pool so compute never waits
+# on disk. Every file is written to a temporary name in the target
+# directory and renamed on completion, so readers never see partial
+# files. Call flush_writes() once at the end of a run as the barrier.
+# -----------------------------
+COMPRESSION_SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+_settings = {
+    "compression": None,
+    "max_workers": 4,
+}
+
+_lock = threading.Lock()
+_state = {
+    "executor": None,
+    "pid": None,
+    "pending": {},
+}
+
+
+def configure_writer(compression=None, max_workers=4):
+    """
+    Sets the compression ("gzip", "zstd" or None) applied to every table
+    and the number of writer threads. zstd needs the `zstandard` package.
+    """
+
+    if compression not in (None, *COMPRESSION_SUFFIXES):
+        raise ValueError(
+            f"Unknown compression {compression!r}; "
+            f"expected one of {sorted(COMPRESSION_SUFFIXES)} or None."
+        )
+
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be >= 1, got {max_workers}.")
+
+    flush_writes()
+
+    _settings["compression"] = compression
+    _settings["max_workers"] = max_workers
+
+
+def _executor():
+
+    # A forked worker process inherits the executor without its threads
+    with _lock:
+        if _state["executor"] is None or _state["pid"] != os.getpid():
+            _state["executor"] = ThreadPoolExecutor(
+                max_workers=_settings["max_workers"],
+                thread_name_prefix="table-writer"
+            )
+            _state["pid"] = os.getpid()
+            _state["pending"] = {}
+
+        return _state["executor"]
+
+
+def _atomic_write(path, write_fn, replaces=()):
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = os.path.join(
+        directory,
+        f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp"
+    )
+
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Variants under another codec are now stale
+    for stale_path in replaces:
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    return path
+
+
+def write_file(path, write_fn, replaces=()):
+    """
+    Schedules write_fn(tmp_path) on the writer pool and atomically renames
+    the result to path, then removes the paths in `replaces`. Returns
+    path.
+    """
+
+    executor = _executor()
+
+    with _lock:
+        previous = _state["pending"].get(path)
+
+        # Writes to the same path land in submission order
+        def task():
+            if previous is not None:
+                previous.result()
+            return _atomic_write(path, write_fn, replaces)
+
+        _state["pending"][path] = executor.submit(task)
+
+    return path
+
+
+def write_npz(path, save_fn, *args, **kwargs):
+    """
+    Schedules save_fn(file, *args, **kwargs) on the writer pool, e.g.
+    np.savez_compressed or scipy.sparse.save_npz. Returns path.
+    """
+
+    # A file object keeps numpy / scipy from appending ".npz" to the
+    # temporary name
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            save_fn(f, *args, **kwargs)
+
+    return write_file(path, write)
+
+
+def write_text(path, text, encoding="utf-8"):
+    """
+    Schedules writing `text` to path on the writer pool. Returns path.
+    """
+
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding=encoding) as f:
+            f.write(text)
+
+    return write_file(path, write)
+
+
+def write_table(df, path, **to_csv_kwargs):
+    """
+    Schedules df.to_csv(path) on the writer pool, compressed with the
+    configured codec (the matching suffix is appended to path). Returns
+    the final path. The DataFrame must not be modified afterwards.
+    """
+
+    compression = _settings["compression"]
+    variants = _variants(path)
+
+    if compression is not None:
+        path += COMPRESSION_SUFFIXES[compression]
+        to_csv_kwargs["compression"] = {"method": compression}
+
+    return write_file(
+        path,
+        lambda tmp_path: df.to_csv(tmp_path, **to_csv_kwargs),
+        replaces=[variant for variant in variants if variant != path]
+    )
+
+
+def flush_writes():
+    """
+    Waits for every scheduled write and re-raises the first failure.
+    Returns the list of written paths.
+    """
+
+    with _lock:
+        if _state["pid"] != os.getpid():
+            return []
+        pending = dict(_state["pending"])
+        _state["pending"].clear()
+
+    wait(pending.values())
+
+    for future in pending.values():
+        future.result()
+
+    return list(pending)
+
+
+def _variants(path):
+    return [path] + [path + suffix for suffix in COMPRESSION_SUFFIXES.values()]
+
+
+def resolve_path(path):
+    """
+    Returns the on-disk path of a table, accepting compressed variants,
+    after waiting for any pending write of it.
+    """
+
+    candidates = _variants(path)
+
+    with _lock:
+        same_process = _state["pid"] == os.getpid()
+        pending = [
+            _state["pending"].get(candidate) for candidate in candidates
+        ] if same_process else []
+
+    for future in pending:
+        if future is not None:
+            future.result()
+
+    # Newest variant wins, in case a stale one survived an older run
+    existing = [
+        candidate for candidate in candidates if os.path.exists(candidate)
+    ]
+
+    if not existing:
+        return path
+
+    return max(existing, key=os.path.getmtime)
+
+
+def load_table(source, **read_csv_kwargs):
+    """
+    Returns a DataFrame from either a CSV path or an in-memory DataFrame.
+
+    Stages accept both, so a caller that already holds the data (e.g. a
+    partitioned run) can skip re-parsing the CSV. DataFrames are copied
+    because stages add columns to their input. Paths resolve to their
+    compressed variant and wait for a pending write of the same table.
+    """
+
+    if isinstance(source, pd.DataFrame):
+        return source.copy()
+
+    return pd.read_csv(resolve_path(source), **read_csv_kwargs)
@@ -1,7 +1,12 @@
 import os
-import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
+from src.cohort_analysis import (
+    COHORT_MATRIX_FILE,
+    load_cohort_matrix,
+    downsample_retention,
+)
+from src.table_io import load_table, resolve_path
 
 
 
@@ -106,7 +111,7 @@ def _save_line_plot(df, x_col, y_col, title, x_label, y_label, save_path):
     plt.close()
 
 
-def _save_heatmap(matrix_df, title, save_path):
+def _save_heatmap(matrix_df, title, save_path, y_label="Cohort Month"):
 
     plt.figure(figsize=(10, 6))
 
@@ -118,7 +123,7 @@ def _save_heatmap(matrix_df, title, save_path):
 
     plt.title(title, color=THEME["dark"])
     plt.xlabel("Cohort Index", color=THEME["dark"])
-    plt.ylabel("Cohort Month", color=THEME["dark"])
+    plt.ylabel(y_label, color=THEME["dark"])
 
     plt.colorbar()
     plt.tight_layout()
@@ -131,7 +136,7 @@ def _save_heatmap(matrix_df, title, save_path):
 # -----------------------------
 def _plot_revenue_by_segment(csv_dir, fig_dir):
 
-    df = pd.read_csv(os.path.join(csv_dir, "segment_analysis.csv"))
+    df = load_table(os.path.join(csv_dir, "segment_analysis.csv"))
 
     _save_bar_plot(
         df=df,
@@ -146,7 +151,7 @@ def _plot_revenue_by_segment(csv_dir, fig_dir):
 
 def _plot_rfm_score_distribution(csv_dir, fig_dir):
 
-    df = pd.read_csv(os.path.join(csv_dir, "rfm_analysis.csv"))
+    df = load_table(os.path.join(csv_dir, "rfm_analysis.csv"))
 
     counts = (
         df["RFM_score"]
@@ -170,21 +175,31 @@ def _plot_rfm_score_distribution(csv_dir, fig_dir):
 
 def _plot_cohort_retention_heatmap(csv_dir, fig_dir):
 
-    retention_matrix_df = pd.read_csv(
-        os.path.join(csv_dir, "retention_matrix.csv"),
-        index_col=0
-    )
+    sparse_path = os.path.join(csv_dir, COHORT_MATRIX_FILE)
+    y_label = "Cohort Month"
+
+    # Prefer the sparse matrix; fine-grained cohorts are block-averaged
+    if os.path.exists(resolve_path(sparse_path)):
+        matrix = load_cohort_matrix(sparse_path)
+        retention_matrix_df = downsample_retention(matrix)
+        y_label = f"Cohort ({matrix['granularity']})"
+    else:
+        retention_matrix_df = load_table(
+            os.path.join(csv_dir, "retention_matrix.csv"),
+            index_col=0
+        )
 
     _save_heatmap(
         matrix_df=retention_matrix_df,
         title="Customer Retention Cohort Heatmap",
-        save_path=os.path.join(fig_dir, "cohort_retention_heatmap.png")
+        save_path=os.path.join(fig_dir, "cohort_retention_heatmap.png"),
+        y_label=y_label
     )
 
 
 def _plot_monthly_revenue_trend(csv_dir, fig_dir):
 
-    df = pd.read_csv(os.path.join(csv_dir, "monthly_metrics.csv"))
+    df = load_table(os.path.join(csv_dir, "monthly_metrics.csv"))
 
     _save_line_plot(
         df=df,
@@ -199,7 +214,7 @@ def _plot_monthly_revenue_trend(csv_dir, fig_dir):
 
 def _plot_monthly_order_trend(csv_dir, fig_dir):
 
-    df = pd.read_csv(os.path.join(csv_dir, "monthly_metrics.csv"))
+    df = load_table(os.path.join(csv_dir, "monthly_metrics.csv"))
 
     _save_line_plot(
         df=df,